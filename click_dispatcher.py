@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from sun_io import PyAutoGuiClickSink
+from telemetry import Telemetry
+
+
+class ClickHistory:
+    # Answers "was there a click within radius px in the last window seconds"
+    # in constant time: clicks are hashed into a grid of radius-sized cells,
+    # so only the 3x3 neighbourhood is checked. Old entries expire lazily.
+
+    def __init__(self, radius=30, window=0.5):
+        self.radius = radius
+        self.window = window
+        self.cells = {}  # (cell_x, cell_y) -> deque of (x, y, time), oldest first
+        self.order = deque()  # (time, cell) for every entry, oldest first
+
+    def __len__(self):
+        return len(self.order)
+
+    def cell(self, x, y):
+        return (int(x // self.radius), int(y // self.radius))
+
+    def expire(self, now):
+        cutoff = now - self.window
+        while self.order and self.order[0][0] <= cutoff:
+            _, key = self.order.popleft()
+            entries = self.cells[key]
+            entries.popleft()
+            if not entries:
+                del self.cells[key]
+
+    def add(self, x, y, now=None):
+        now = time.time() if now is None else now
+        self.expire(now)
+        key = self.cell(x, y)
+        self.cells.setdefault(key, deque()).append((x, y, now))
+        self.order.append((now, key))
+
+    def contains(self, x, y, now=None):
+        now = time.time() if now is None else now
+        self.expire(now)
+        cell_x, cell_y = self.cell(x, y)
+        radius_sq = self.radius * self.radius
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for prev_x, prev_y, _ in self.cells.get((cell_x + dx, cell_y + dy), ()):
+                    if (x - prev_x) ** 2 + (y - prev_y) ** 2 < radius_sq:
+                        return True
+        return False
+
+    def clear(self):
+        self.cells.clear()
+        self.order.clear()
+
+
+class ClickDispatcher:
+    # Dedicated click executor. Detection submits target points; this thread
+    # clicks them in nearest-neighbour order from the current cursor position,
+    # keeps at least min_interval between clicks without blocking detection,
+    # and records the delay from detection to click for every target.
+    #
+    # Hooks set by the owner:
+    #   resolve(target) -> (x, y) to click, or None to skip the target
+    #   on_click(target, (x, y), click_time) after each click
+
+    def __init__(self, sink=None, min_interval=0.05, max_age=0.25, telemetry=None):
+        self.sink = sink  # Anything with click(x, y); PyAutoGuiClickSink by default
+        self.min_interval = min_interval
+        self.max_age = max_age  # Drop targets detected longer ago than this (s)
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.stats = self.telemetry.stage('click')
+        self.resolve = None
+        self.on_click = None
+
+        self.pending = []
+        self.cond = threading.Condition()
+        self.last_click_time = float('-inf')  # perf_counter time of the last click
+        self.cursor = None  # Last click position
+        self.latencies = deque(maxlen=200)  # Detection-to-click delays (s)
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def submit(self, targets):
+        # Newer targets replace pending ones for the same tracked sun
+        with self.cond:
+            track_ids = {t['track_id'] for t in targets if t.get('track_id') is not None}
+            if track_ids:
+                self.pending = [t for t in self.pending if t.get('track_id') not in track_ids]
+            self.pending.extend(targets)
+            self.cond.notify()
+
+    def clear(self):
+        with self.cond:
+            self.pending.clear()
+
+    def run(self):
+        while self.running:
+            with self.cond:
+                if not self.pending:
+                    self.cond.wait(0.1)
+            self.flush()
+
+    def take_nearest(self):
+        # Pending target closest to the cursor (nearest-neighbour path)
+        with self.cond:
+            if not self.pending:
+                return None
+            if self.cursor is None or len(self.pending) == 1:
+                return self.pending.pop(0)
+            points = np.array([(t['x'], t['y']) for t in self.pending], dtype=np.float64)
+            distances = np.hypot(points[:, 0] - self.cursor[0], points[:, 1] - self.cursor[1])
+            return self.pending.pop(int(np.argmin(distances)))
+
+    def flush(self):
+        # Click everything pending; also used directly (no thread) by the replay harness
+        while self.running or self.thread is None:
+            target = self.take_nearest()
+            if target is None:
+                break
+
+            start = time.perf_counter()
+            if time.time() - target['detected_at'] > self.max_age:
+                self.stats.skipped += 1
+                continue
+
+            position = self.resolve(target) if self.resolve else (target['x'], target['y'])
+            if position is None:
+                continue
+
+            wait = self.min_interval - (start - self.last_click_time)
+            if wait > 0:
+                time.sleep(wait)
+                # Re-aim: the sun kept moving while we waited
+                if self.resolve:
+                    position = self.resolve(target) or position
+
+            if self.sink is None:
+                self.sink = PyAutoGuiClickSink()
+            self.sink.click(*position)
+
+            finished = time.perf_counter()
+            now = time.time()
+            self.last_click_time = finished
+            self.cursor = position
+            self.latencies.append(now - target['detected_at'])
+            self.telemetry.record('click', finished - start, now)
+            if self.on_click:
+                self.on_click(target, position, now)
+
+    def latency_summary(self):
+        # Detection-to-click percentiles in ms
+        if not self.latencies:
+            return {}
+        ms = np.asarray(self.latencies) * 1000.0
+        return {
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p90_ms': float(np.percentile(ms, 90)),
+            'max_ms': float(ms.max())
+        }
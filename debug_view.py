@@ -0,0 +1,131 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from sun_pipeline import FrameQueue
+
+WINDOW_NAME = "PVZ Bot View"
+
+
+class DebugRenderer:
+    # Draws the debug view on its own thread. The detection thread only asks
+    # wants_frame() and, at most max_fps times a second, posts a downscaled
+    # copy of the frame plus its matches into a single-slot mailbox; drawing,
+    # imshow and waitKey never run on the hot path. All HighGUI calls stay on
+    # the renderer thread.
+
+    def __init__(self, max_fps=15.0, scale=0.5, telemetry=None):
+        self.max_fps = max_fps
+        self.scale = scale  # Display size relative to the captured frame
+        self.telemetry = telemetry
+        self.mailbox = FrameQueue(maxsize=1)
+        self.next_due = 0.0
+
+        self.enabled = False  # Set by the poster; the renderer opens/closes the window to match
+        self.quit_requested = False  # 'q' pressed in the window
+        self.running = False
+        self.thread = None
+        self.window_created = False
+
+        # Two downscaled BGRA slots: one in the mailbox, one being drawn
+        self.slots = []
+        self.slot_index = 0
+        self.display = None  # BGR image the overlay is drawn on
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.quit_requested = False
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def wants_frame(self, now=None):
+        now = time.time() if now is None else now
+        return self.enabled and self.running and now >= self.next_due and not len(self.mailbox)
+
+    def post(self, frame_bgra, matches, paused, overlay_lines, downscale_factor):
+        # Called on the detection thread; the only per-frame cost is one small resize
+        start = time.perf_counter()
+        self.next_due = time.time() + 1.0 / self.max_fps
+
+        h, w = frame_bgra.shape[:2]
+        size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+        if not self.slots or self.slots[0].shape[:2] != (size[1], size[0]):
+            self.slots = [np.empty((size[1], size[0], 4), dtype=np.uint8) for _ in range(2)]
+        small = self.slots[self.slot_index]
+        self.slot_index = (self.slot_index + 1) % len(self.slots)
+        cv2.resize(frame_bgra, size, dst=small, interpolation=cv2.INTER_NEAREST)
+
+        # Boxes in display pixels (matches are in downscaled-frame pixels)
+        box_scale = self.scale / downscale_factor
+        boxes = [(int(m['location'][0] * box_scale), int(m['location'][1] * box_scale),
+                  int(m['width'] * box_scale), int(m['height'] * box_scale),
+                  m['confidence'], m['template']) for m in matches]
+
+        self.mailbox.put({'frame': small, 'boxes': boxes, 'paused': paused, 'lines': overlay_lines})
+        if self.telemetry is not None:
+            self.telemetry.record('render_post', time.perf_counter() - start)
+
+    def run(self):
+        try:
+            while self.running:
+                if not self.enabled:
+                    self.close_window()
+                item = self.mailbox.get(timeout=0.05)
+                if item is not None and self.enabled:
+                    self.draw(item)
+                elif self.window_created:
+                    # Keep the window responsive between frames
+                    self.handle_keys()
+        finally:
+            self.close_window()
+
+    def draw(self, item):
+        start = time.perf_counter()
+        if not self.window_created:
+            cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(WINDOW_NAME, 960, 540)
+            self.window_created = True
+
+        frame = item['frame']
+        if self.display is None or self.display.shape[:2] != frame.shape[:2]:
+            self.display = np.empty((frame.shape[0], frame.shape[1], 3), dtype=np.uint8)
+        display = self.display
+        cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=display)
+
+        if item['paused']:
+            cv2.putText(display, "PAUSED", (25, 25),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+
+        for x, y, w, h, confidence, template in item['boxes']:
+            color = (0, 255, 0) if 'sun.png' in template else (255, 0, 255)
+            cv2.rectangle(display, (x, y), (x + w, y + h), color, 1)
+            cv2.putText(display, f"{confidence:.2f}", (x, y - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
+
+        for i, line in enumerate(item['lines']):
+            cv2.putText(display, line, (5, 15 + 15 * i),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 0), 1)
+
+        cv2.imshow(WINDOW_NAME, display)
+        self.handle_keys()
+        if self.telemetry is not None:
+            self.telemetry.record('render', time.perf_counter() - start)
+
+    def handle_keys(self):
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            self.quit_requested = True
+
+    def close_window(self):
+        if self.window_created:
+            cv2.destroyWindow(WINDOW_NAME)
+            cv2.waitKey(1)
+            self.window_created = False
@@ -0,0 +1,64 @@
+import time
+
+
+class FrameScheduler:
+    # Paces the detection loop at a target rate by sleeping until the next
+    # frame deadline (no busy waiting). With adaptive on, the rate is lowered
+    # to the least that keeps sun-to-click latency under max_latency and
+    # capped so detection stays within cpu_budget of one core.
+
+    def __init__(self, target_fps=30.0, min_fps=5.0, cpu_budget=0.5, max_latency=0.15):
+        self.target_fps = target_fps  # Upper bound on the detection rate
+        self.min_fps = min_fps
+        self.cpu_budget = cpu_budget  # Fraction of one core detection may use
+        self.max_latency = max_latency  # Worst-case appear-to-click delay (s)
+        self.adaptive = True
+        self.smoothing = 0.2  # How quickly the rate follows the measurements
+
+        self.fps = target_fps
+        self.next_deadline = None
+
+    @property
+    def period(self):
+        return 1.0 / self.fps
+
+    def reset(self):
+        self.next_deadline = None
+
+    def wait(self):
+        # Sleep until the next deadline; if we fell behind, don't try to catch up
+        now = time.perf_counter()
+        if self.next_deadline is None:
+            self.next_deadline = now
+
+        delay = self.next_deadline - now
+        if delay > 0:
+            time.sleep(delay)
+            self.next_deadline += self.period
+        else:
+            self.next_deadline = now + self.period
+
+    def adapt(self, frame_times, latencies=None):
+        # frame_times: recent per-frame processing (CPU) times in seconds.
+        # latencies: recent capture-to-detection-done times, which add any
+        # queue wait; defaults to frame_times when the two are the same.
+        if not self.adaptive:
+            self.fps = self.target_fps
+            return
+        if not frame_times:
+            return
+
+        work = sum(frame_times) / len(frame_times)
+        if work <= 0:
+            return
+        latency = sum(latencies) / len(latencies) if latencies else work
+
+        # A sun that appears right after a capture waits one period plus the
+        # capture-to-detection latency, so the slowest rate meeting the bound is:
+        slack = self.max_latency - latency
+        desired = 1.0 / slack if slack > 0 else self.target_fps
+        # Never spend more than cpu_budget of a core on detection
+        desired = min(desired, self.cpu_budget / work)
+        desired = max(self.min_fps, min(self.target_fps, desired))
+
+        self.fps += (desired - self.fps) * self.smoothing
@@ -0,0 +1,393 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from sun_detection import match_template_regions
+
+
+# Pluggable template matching backends. load() is given every template
+# whenever the set changes; match() takes the ones to run this frame in
+# priority order and returns the combined matches. With early_exit it stops
+# after the first template (or wave of templates) that found something.
+# Given a Telemetry, each template's matching time is recorded as
+# 'match:<template name>'.
+
+
+def timed_match(frame_gray, template_info, regions, coarse_gray, params):
+    # match_template_regions plus its duration, measured where it ran
+    start = time.perf_counter()
+    matches = match_template_regions(frame_gray, template_info, regions, coarse_gray, params)
+    return matches, time.perf_counter() - start
+
+
+def record_template_time(telemetry, name, duration):
+    if telemetry is not None:
+        telemetry.record(f"match:{name}", duration)
+
+
+class SerialBackend:
+    name = 'serial'
+
+    def __init__(self, telemetry=None):
+        self.telemetry = telemetry
+
+    def match(self, frame_gray, coarse_gray, templates, regions, params, early_exit):
+        best_matches = []
+        for template_info in templates:
+            matches, duration = timed_match(frame_gray, template_info, regions, coarse_gray, params)
+            record_template_time(self.telemetry, template_info['name'], duration)
+            if matches:
+                best_matches.extend(matches)
+                if early_exit:
+                    break
+        return best_matches
+
+    def load(self, templates):
+        pass
+
+    def close(self):
+        pass
+
+
+class ThreadBackend:
+    # One job per template on a thread pool (cv2.matchTemplate releases the GIL).
+    # With early exit, templates go out in waves of max_workers so no future
+    # is ever left running into the next frame.
+    name = 'thread'
+
+    def __init__(self, max_workers=3, telemetry=None):
+        self.max_workers = max_workers
+        self.telemetry = telemetry
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def match(self, frame_gray, coarse_gray, templates, regions, params, early_exit):
+        wave_size = self.max_workers if early_exit else len(templates)
+        best_matches = []
+        for i in range(0, len(templates), max(1, wave_size)):
+            wave = templates[i:i + wave_size]
+            futures = [self.pool.submit(timed_match, frame_gray, template_info,
+                                        regions, coarse_gray, params)
+                       for template_info in wave]
+            for template_info, future in zip(wave, futures):
+                matches, duration = future.result()
+                record_template_time(self.telemetry, template_info['name'], duration)
+                best_matches.extend(matches)
+            if best_matches and early_exit:
+                break
+        return best_matches
+
+    def load(self, templates):
+        pass
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def split_stripes(frame_shape, regions, stripes, overlap, min_height):
+    # Split regions (None = whole frame) into horizontal stripes that overlap
+    # by one template height, so no sun is cut in half
+    frame_h, frame_w = frame_shape[:2]
+    result = []
+    for region in regions:
+        x, y, w, h = region if region is not None else (0, 0, frame_w, frame_h)
+        count = max(1, min(stripes, h // max(1, min_height)))
+        step = -(-h // count)  # Ceiling division
+        for i in range(count):
+            y0 = y + i * step
+            y1 = min(y + h, y0 + step + overlap)
+            if y1 > y0:
+                result.append((x, y0, w, y1 - y0))
+    return result
+
+
+class TiledBackend:
+    # Splits large frames into overlapping stripes and matches every
+    # (template, stripe) pair on its own thread, spreading one big
+    # matchTemplate across all cores. Duplicates in the overlaps are
+    # removed by the caller's NMS.
+    name = 'tiled'
+
+    def __init__(self, max_workers=None, min_stripe_height=96, telemetry=None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.min_stripe_height = min_stripe_height
+        self.telemetry = telemetry
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def match(self, frame_gray, coarse_gray, templates, regions, params, early_exit):
+        overlap = params['template_padding'][1] - 1
+        stripes = split_stripes(frame_gray.shape, regions, self.max_workers, overlap,
+                                self.min_stripe_height)
+        # With early exit, one template at a time (its stripes in parallel)
+        groups = [[t] for t in templates] if early_exit else [templates]
+
+        best_matches = []
+        for group in groups:
+            jobs = [(template_info, self.pool.submit(timed_match, frame_gray, template_info,
+                                                     [stripe], coarse_gray, params))
+                    for template_info in group for stripe in stripes]
+            # A template's time is the sum over its stripes
+            durations = {}
+            for template_info, future in jobs:
+                matches, duration = future.result()
+                name = template_info['name']
+                durations[name] = durations.get(name, 0.0) + duration
+                best_matches.extend(matches)
+            for name, duration in durations.items():
+                record_template_time(self.telemetry, name, duration)
+            if best_matches and early_exit:
+                break
+        return best_matches
+
+    def load(self, templates):
+        pass
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+# Process pool worker state: templates are sent once per worker, frames
+# arrive through a shared memory block instead of being pickled per job
+_worker_templates = {}
+_worker_shm = None
+
+
+def _init_worker(templates):
+    global _worker_templates
+    _worker_templates = templates
+
+
+def _warm_up(delay):
+    # Holds the worker briefly so each warm-up job lands on a different one
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _attach_shared(name):
+    global _worker_shm
+    if _worker_shm is None or _worker_shm.name != name:
+        if _worker_shm is not None:
+            _worker_shm.close()
+        try:
+            # The parent owns the block (Python 3.13+ can skip tracking it here)
+            _worker_shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            _worker_shm = shared_memory.SharedMemory(name=name)
+    return _worker_shm
+
+
+def _process_job(shm_name, frame_shape, coarse_shape, template_name, regions, params):
+    shm = _attach_shared(shm_name)
+    frame_gray = np.ndarray(frame_shape, dtype=np.uint8, buffer=shm.buf)
+    coarse_gray = None
+    if coarse_shape is not None:
+        coarse_gray = np.ndarray(coarse_shape, dtype=np.uint8, buffer=shm.buf,
+                                 offset=frame_shape[0] * frame_shape[1])
+    return timed_match(frame_gray, _worker_templates[template_name], regions, coarse_gray, params)
+
+
+class ProcessBackend:
+    # Matches on a process pool, free of the GIL for the Python parts of
+    # matching (peak extraction, NMS bookkeeping). The frame (and coarse
+    # level) is copied once into shared memory per frame.
+    name = 'process'
+
+    def __init__(self, max_workers=None, telemetry=None):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.telemetry = telemetry
+        self.templates = None  # Every loaded template; a frame may match only some
+        self.pool = None
+        self.shm = None
+        self.ready = False  # Every worker started and holding the templates
+
+    def start(self, templates):
+        # Workers get a copy of the templates without the color images
+        payload = {}
+        for template_info in templates:
+            payload[template_info['name']] = {
+                'name': template_info['name'],
+                'gray': template_info['gray'],
+                'width': template_info['width'],
+                'height': template_info['height'],
+                'variants': template_info.get('variants', [])
+            }
+        # Spawned, not forked: the capture, click and UI threads are running
+        # by now, and fork() in a multithreaded process can deadlock
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker, initargs=(payload,))
+        self.ready = False
+        threading.Thread(target=self.warm_up, args=(self.pool,), daemon=True).start()
+
+    def warm_up(self, pool):
+        # OPTIMIZATION: Starting a worker (interpreter, imports, templates)
+        # takes a few hundred ms; pay it here, off the detection thread
+        pids = set()
+        try:
+            for _ in range(5):
+                futures = [pool.submit(_warm_up, 0.02) for _ in range(self.max_workers)]
+                pids.update(future.result() for future in futures)
+                if len(pids) >= self.max_workers:
+                    break
+        except (RuntimeError, CancelledError) as e:
+            # Shut down by a reload, or the workers failed to start
+            if self.pool is pool:
+                print(f"Matching worker processes failed to start: {e}")
+            return
+        if self.pool is pool:
+            self.ready = True
+
+    def share_frame(self, frame_gray, coarse_gray):
+        size = frame_gray.nbytes + (coarse_gray.nbytes if coarse_gray is not None else 0)
+        if self.shm is None or self.shm.size < size:
+            self.release_shared()
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+
+        np.ndarray(frame_gray.shape, dtype=np.uint8, buffer=self.shm.buf)[:] = frame_gray
+        if coarse_gray is not None:
+            np.ndarray(coarse_gray.shape, dtype=np.uint8, buffer=self.shm.buf,
+                       offset=frame_gray.nbytes)[:] = coarse_gray
+
+    def match(self, frame_gray, coarse_gray, templates, regions, params, early_exit):
+        if self.pool is None:
+            self.start(self.templates or templates)
+        self.share_frame(frame_gray, coarse_gray)
+        coarse_shape = coarse_gray.shape if coarse_gray is not None else None
+
+        wave_size = self.max_workers if early_exit else len(templates)
+        best_matches = []
+        for i in range(0, len(templates), max(1, wave_size)):
+            wave = templates[i:i + wave_size]
+            futures = [self.pool.submit(_process_job, self.shm.name, frame_gray.shape, coarse_shape,
+                                        template_info['name'], regions, params)
+                       for template_info in wave]
+            for template_info, future in zip(wave, futures):
+                matches, duration = future.result()
+                record_template_time(self.telemetry, template_info['name'], duration)
+                best_matches.extend(matches)
+            if best_matches and early_exit:
+                break
+        return best_matches
+
+    def release_shared(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def load(self, templates):
+        # Templates changed: restart the workers, warming them in the background
+        self.templates = list(templates)
+        self.stop_pool()
+        if self.templates:
+            self.start(self.templates)
+
+    def stop_pool(self):
+        self.ready = False
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def close(self):
+        self.stop_pool()
+        self.release_shared()
+
+
+class AutoBackend:
+    # Picks the fastest backend per workload (template count and matched
+    # area) by timing each candidate for a few frames, then re-probes every
+    # reprobe_interval frames in case conditions change. Candidates with
+    # ready == False (worker processes still starting) sit out until ready.
+    name = 'auto'
+
+    def __init__(self, backends, trials=3, reprobe_interval=1000):
+        self.backends = backends
+        self.trials = trials  # Timed frames per candidate (after one warm-up)
+        self.reprobe_interval = reprobe_interval
+        self.samples = {}  # key -> {backend name: [seconds]}
+        self.choice = {}  # key -> backend name
+        self.calls = {}  # key -> frames since the choice was made
+        self.last_backend = None
+
+    def workload_key(self, frame_gray, templates, regions):
+        area = 0
+        for region in regions:
+            area += frame_gray.size if region is None else region[2] * region[3]
+        return (len(templates), int(np.log2(max(area, 1))))
+
+    def pick(self, key):
+        name = self.choice.get(key)
+        if name is not None and self.calls.get(key, 0) < self.reprobe_interval:
+            self.calls[key] = self.calls.get(key, 0) + 1
+            return name
+
+        if name is not None:
+            # Time to re-probe
+            self.choice.pop(key)
+            self.samples.pop(key, None)
+
+        samples = self.samples.setdefault(key, {n: [] for n in self.backends})
+        ready = [n for n, backend in self.backends.items() if getattr(backend, 'ready', True)]
+        pending = [n for n in ready if len(samples[n]) < self.trials + 1]
+        if pending:
+            return min(pending, key=lambda n: len(samples[n]))
+
+        # Every ready candidate measured: keep the lowest median (warm-up dropped)
+        medians = {n: float(np.median(samples[n][1:])) for n in ready}
+        name = min(medians, key=medians.get)
+        self.choice[key] = name
+        self.calls[key] = 0
+        print(f"Matching backend for {key[0]} template(s), ~2^{key[1]} px: {name} "
+              f"({medians[name] * 1000:.1f} ms)")
+        return name
+
+    def match(self, frame_gray, coarse_gray, templates, regions, params, early_exit):
+        key = self.workload_key(frame_gray, templates, regions)
+        name = self.pick(key)
+        backend = self.backends[name]
+        self.last_backend = name
+
+        start = time.perf_counter()
+        matches = backend.match(frame_gray, coarse_gray, templates, regions, params, early_exit)
+        elapsed = time.perf_counter() - start
+
+        if key not in self.choice:
+            self.samples[key][name].append(elapsed)
+        return matches
+
+    def load(self, templates):
+        for backend in self.backends.values():
+            backend.load(templates)
+        self.samples.clear()
+        self.choice.clear()
+        self.calls.clear()
+
+    def close(self):
+        for backend in self.backends.values():
+            backend.close()
+
+
+def create_backend(name, max_workers=3, telemetry=None):
+    if name == 'serial':
+        return SerialBackend(telemetry)
+    if name == 'thread':
+        return ThreadBackend(max_workers, telemetry=telemetry)
+    if name == 'tiled':
+        return TiledBackend(telemetry=telemetry)
+    if name == 'process':
+        return ProcessBackend(telemetry=telemetry)
+    if name == 'auto':
+        backends = {
+            'serial': SerialBackend(telemetry),
+            'thread': ThreadBackend(max_workers, telemetry=telemetry),
+            'tiled': TiledBackend(telemetry=telemetry)
+        }
+        # Worker processes only pay off with cores to spare
+        if (os.cpu_count() or 1) >= 4:
+            backends['process'] = ProcessBackend(telemetry=telemetry)
+        return AutoBackend(backends)
+    raise ValueError(f"Unknown matching backend: {name}")
@@ -0,0 +1,153 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+class PlayfieldLocator:
+    # Finds the PvZ playfield once per monitor and caches it as an ROI.
+    # Uses an anchor template if one is provided, otherwise looks for the
+    # lawn (largest green area) in a low resolution grab of the monitor.
+
+    def __init__(self, anchor_path=None, search_scale=0.125, revalidate_interval=5.0):
+        self.search_scale = search_scale
+        self.revalidate_interval = revalidate_interval
+        self.retry_interval = 2.0  # Back-off between failed full searches
+        self.padding = 0.1  # Grow the found playfield by 10% on each side
+        self.anchor_threshold = 0.6
+        self.min_lawn_fraction = 0.05  # Lawn must cover 5% of the monitor
+        self.move_tolerance = 3  # Low-res pixels the playfield may drift
+
+        # Lawn green in OpenCV HSV (covers both stripe shades)
+        self.lawn_lower = np.array([35, 80, 60], dtype=np.uint8)
+        self.lawn_upper = np.array([85, 255, 255], dtype=np.uint8)
+
+        self.anchor = None
+        if anchor_path and os.path.exists(anchor_path):
+            anchor_bgr = cv2.imread(anchor_path, cv2.IMREAD_COLOR)
+            if anchor_bgr is not None:
+                anchor_gray = cv2.cvtColor(anchor_bgr, cv2.COLOR_BGR2GRAY)
+                self.anchor = cv2.resize(anchor_gray, None,
+                                         fx=self.search_scale, fy=self.search_scale,
+                                         interpolation=cv2.INTER_AREA)
+                print(f"Playfield anchor loaded: {os.path.basename(anchor_path)}")
+
+        # monitor_index -> {'monitor', 'roi', 'target', 'checked'}
+        self.cache = {}
+
+    def invalidate(self, monitor_index=None):
+        if monitor_index is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(monitor_index, None)
+
+    def get_roi(self, sct, monitor_index, monitor, now=None):
+        # Cached ROI for this monitor; re-validated every revalidate_interval
+        # seconds and re-searched only when the playfield has moved
+        now = time.time() if now is None else now
+        geometry = (monitor['left'], monitor['top'], monitor['width'], monitor['height'])
+        entry = self.cache.get(monitor_index)
+
+        if entry and entry['monitor'] == geometry:
+            if entry['roi'] is None:
+                if now - entry['checked'] < self.retry_interval:
+                    return None
+            elif now - entry['checked'] < self.revalidate_interval:
+                return entry['roi']
+            elif self.validate(sct, monitor, entry):
+                entry['checked'] = now
+                return entry['roi']
+            else:
+                print("Playfield moved, searching again...")
+
+        roi, target = self.locate(sct, monitor)
+        self.cache[monitor_index] = {
+            'monitor': geometry,
+            'roi': roi,
+            'target': target,
+            'checked': now
+        }
+        if roi:
+            print(f"Playfield found on monitor {monitor_index}: {roi}")
+        return roi
+
+    def locate(self, sct, monitor):
+        # Coarse full-monitor search at low resolution
+        small = self.grab_small(sct, monitor)
+        rect = self.find_target(small)
+        if rect is None:
+            return None, None
+
+        scale = 1.0 / self.search_scale
+        target = tuple(int(round(v * scale)) for v in rect)
+        return self.pad_rect(target, monitor), target
+
+    def validate(self, sct, monitor, entry):
+        # Cheap check: grab only the cached ROI and make sure the playfield
+        # is still where we left it
+        roi_x, roi_y, roi_w, roi_h = entry['roi']
+        region = {
+            'left': monitor['left'] + roi_x,
+            'top': monitor['top'] + roi_y,
+            'width': roi_w,
+            'height': roi_h
+        }
+        rect = self.find_target(self.grab_small(sct, region))
+        if rect is None:
+            return False
+
+        expected_x = (entry['target'][0] - roi_x) * self.search_scale
+        expected_y = (entry['target'][1] - roi_y) * self.search_scale
+        return (abs(rect[0] - expected_x) <= self.move_tolerance and
+                abs(rect[1] - expected_y) <= self.move_tolerance)
+
+    def grab_small(self, sct, region):
+        frame_bgra = np.asarray(sct.grab(region))
+        return cv2.resize(frame_bgra, None, fx=self.search_scale, fy=self.search_scale,
+                          interpolation=cv2.INTER_AREA)
+
+    def find_target(self, small_bgra):
+        # Playfield rectangle (x, y, w, h) in low-res image coordinates
+        if self.anchor is not None:
+            return self.find_anchor(small_bgra)
+        return self.find_lawn(small_bgra)
+
+    def find_anchor(self, small_bgra):
+        h, w = self.anchor.shape[:2]
+        if small_bgra.shape[0] < h or small_bgra.shape[1] < w:
+            return None
+
+        small_gray = cv2.cvtColor(small_bgra, cv2.COLOR_BGRA2GRAY)
+        result = cv2.matchTemplate(small_gray, self.anchor, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val < self.anchor_threshold:
+            return None
+        return (max_loc[0], max_loc[1], w, h)
+
+    def find_lawn(self, small_bgra):
+        hsv = cv2.cvtColor(cv2.cvtColor(small_bgra, cv2.COLOR_BGRA2BGR), cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, self.lawn_lower, self.lawn_upper)
+        # Close the gaps left by plants and zombies standing on the lawn
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        if count <= 1:
+            return None
+
+        # Label 0 is the background
+        largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+        x, y, w, h, area = stats[largest]
+        if area < self.min_lawn_fraction * mask.shape[0] * mask.shape[1]:
+            return None
+        return (int(x), int(y), int(w), int(h))
+
+    def pad_rect(self, rect, monitor):
+        x, y, w, h = rect
+        pad_x = int(w * self.padding)
+        pad_y = int(h * self.padding)
+        x0 = max(0, x - pad_x)
+        y0 = max(0, y - pad_y)
+        x1 = min(monitor['width'], x + w + pad_x)
+        y1 = min(monitor['height'], y + h + pad_y)
+        return (x0, y0, x1 - x0, y1 - y0)
@@ -0,0 +1,207 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# Session recorder: keeps what the bot saw and did so it can be tuned and
+# regression-tested offline. A recording is a directory:
+#
+#     session.json        bot settings, mode and final counts
+#     frames.jsonl        one line per frame: chunk/offset, timestamp, capture
+#                         region, matches and stage timings (ms)
+#     clicks.jsonl        one line per click: time, position, template
+#     chunk_000000.npz    'frames' array of up to chunk_frames images
+#
+# Frames are either the downscaled gray frames the matcher ran on ('gray',
+# compact) or the full-resolution BGR capture ('crop', bit-exact replays).
+# Writing happens on a background thread behind a bounded queue; when the
+# disk can't keep up, frames are dropped from the recording, never from
+# detection. sun_io.RecordingSource replays a recording.
+
+RECORDING_VERSION = 1
+MODES = ('gray', 'crop')
+
+
+class SessionRecorder:
+    # start(settings) opens the recording, record_frame / record_click
+    # queue data from the detection and click threads, close() drains the
+    # queue and finishes the last chunk.
+
+    def __init__(self, path, mode='gray', chunk_frames=64, queue_size=32, telemetry=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown recording mode '{mode}' (expected one of {', '.join(MODES)})")
+        self.path = path
+        self.mode = mode
+        self.chunk_frames = chunk_frames
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.telemetry = telemetry
+        self.session = {}
+        self.thread = None
+
+        self.frames = 0  # Written to disk
+        self.dropped = 0  # Queue was full
+        self.clicks = 0
+        self.chunks = 0
+
+        # Writer thread state
+        self.chunk_images = []
+        self.chunk_meta = []
+        self.frames_file = None
+        self.clicks_file = None
+
+    def start(self, settings=None):
+        os.makedirs(self.path, exist_ok=True)
+        self.session = {
+            'version': RECORDING_VERSION,
+            'mode': self.mode,
+            'created': time.time(),
+            'settings': settings or {}
+        }
+        self.write_session()
+        self.frames_file = open(os.path.join(self.path, 'frames.jsonl'), 'w')
+        self.clicks_file = open(os.path.join(self.path, 'clicks.jsonl'), 'w')
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        print(f"Recording session to {self.path} ({self.mode} frames)")
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.queue.put(None)  # Blocking: everything queued so far gets written
+        self.thread.join()
+        self.thread = None
+        self.frames_file.close()
+        self.clicks_file.close()
+        self.session.update({'frames': self.frames, 'dropped': self.dropped,
+                             'clicks': self.clicks, 'chunks': self.chunks})
+        self.write_session()
+        print(f"Recorded {self.frames} frame(s), {self.clicks} click(s) to {self.path}"
+              f" ({self.dropped} dropped)")
+
+    # --- Detection / click threads ---
+
+    def record_frame(self, packet, downscale_factor):
+        # Called after detection. Never blocks: a full queue drops the frame.
+        if self.thread is None:
+            return
+        frame_gray = packet.get('frame_gray')
+        if self.mode == 'gray':
+            if frame_gray is None:
+                # Detection stopped before converting (e.g. no color candidates)
+                gray = cv2.cvtColor(packet['frame_bgra'], cv2.COLOR_BGRA2GRAY)
+                if downscale_factor != 1.0:
+                    gray = cv2.resize(gray, None, fx=downscale_factor, fy=downscale_factor,
+                                      interpolation=cv2.INTER_AREA)
+                image = gray
+            else:
+                # The frame buffers are reused, so keep a copy
+                image = frame_gray.copy()
+        else:
+            # Captured frames are fresh arrays; the writer converts them
+            image = packet['frame_bgra']
+
+        region = packet['region']
+        item = {
+            'kind': 'frame',
+            'image': image,
+            'meta': {
+                't': packet['timestamp'],
+                'region': [region['left'], region['top'], region['width'], region['height']],
+                'matches': [{
+                    'location': [int(m['location'][0]), int(m['location'][1])],
+                    'width': m['width'],
+                    'height': m['height'],
+                    'confidence': round(float(m['confidence']), 4),
+                    'template': m['template'],
+                    'click': [int(m['click'][0]), int(m['click'][1])]
+                } for m in packet['matches']],
+                'timings': {name: round(seconds * 1000.0, 3)
+                            for name, seconds in packet.get('timings', {}).items()}
+            }
+        }
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_click(self, target, position, click_time):
+        if self.thread is None:
+            return
+        item = {'kind': 'click', 'meta': {
+            't': click_time,
+            'captured_at': target['captured_at'],
+            'position': [int(position[0]), int(position[1])],
+            'template': target['template'],
+            'confidence': round(float(target['confidence']), 4)
+        }}
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    # --- Writer thread ---
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                if item['kind'] == 'frame':
+                    self.add_frame(item)
+                else:
+                    self.clicks_file.write(json.dumps(item['meta']) + '\n')
+                    self.clicks += 1
+            except (OSError, ValueError) as e:
+                print(f"Recording error: {e}")
+        try:
+            self.flush_chunk()
+        except OSError as e:
+            print(f"Recording error: {e}")
+
+    def add_frame(self, item):
+        image = item['image']
+        if self.mode == 'crop':
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        # A chunk holds same-sized frames; a new ROI size starts a new chunk
+        if self.chunk_images and self.chunk_images[0].shape != image.shape:
+            self.flush_chunk()
+        self.chunk_images.append(image)
+        self.chunk_meta.append(item['meta'])
+        if len(self.chunk_images) >= self.chunk_frames:
+            self.flush_chunk()
+
+    def flush_chunk(self):
+        if not self.chunk_images:
+            return
+        start = time.perf_counter()
+        filename = f"chunk_{self.chunks:06d}.npz"
+        tmp_path = os.path.join(self.path, filename + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, frames=np.stack(self.chunk_images))
+        os.replace(tmp_path, os.path.join(self.path, filename))
+
+        # Frame lines go out after their chunk, so a crash leaves a readable prefix
+        for offset, meta in enumerate(self.chunk_meta):
+            line = dict(meta, index=self.frames, chunk=filename, offset=offset)
+            self.frames_file.write(json.dumps(line) + '\n')
+            self.frames += 1
+        self.frames_file.flush()
+        self.clicks_file.flush()
+
+        self.chunks += 1
+        self.chunk_images = []
+        self.chunk_meta = []
+        if self.telemetry is not None:
+            self.telemetry.record('record', time.perf_counter() - start)
+
+    def write_session(self):
+        tmp_path = os.path.join(self.path, 'session.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.session, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.path, 'session.json'))
@@ -1,14 +1,24 @@
 import cv2
-import numpy as np
-import pyautogui
 import time
 import os
-import mss
 import threading
 import glob
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 from collections import deque
+from sun_detection import (non_max_suppression, boxes_overlap, MotionGate, ColorPrefilter,
+                           TileChangeTracker)
+from playfield_locator import PlayfieldLocator
+from frame_scheduler import FrameScheduler
+from sun_pipeline import FrameQueue, FrameBufferRing
+from sun_tracker import SunTracker
+from sun_io import ScreenCapture
+from click_dispatcher import ClickDispatcher, ClickHistory
+from matching_backends import create_backend, SerialBackend
+from template_bank import TemplateBank, default_cache_dir
+from telemetry import Telemetry
+from template_scheduler import TemplateScheduler
+from debug_view import DebugRenderer
+from session_recorder import SessionRecorder
 
 def resource_path(relative_path):
     try:
@@ -20,7 +30,32 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 class SunClickerBot:
-    def __init__(self, callback_update_ui=None):
+    # Profile keys (see profiles/default.toml): (section, key) -> attribute
+    CONFIG_ATTRIBUTES = {
+        ('detection', 'confidence_threshold'): 'confidence_threshold',
+        ('detection', 'downscale_factor'): 'downscale_factor',
+        ('detection', 'multi_detect'): 'multi_detect',
+        ('detection', 'early_exit'): 'early_exit',
+        ('detection', 'max_clicks_per_frame'): 'max_clicks_per_frame',
+        ('detection', 'multiscale'): 'use_multiscale',
+        ('detection', 'scales'): 'scales',
+        ('detection', 'template_stats'): 'use_template_stats',
+        ('capture', 'monitor'): 'monitor_index',
+        ('capture', 'auto_roi'): 'auto_roi',
+        ('capture', 'pipeline'): 'use_pipeline',
+        ('filters', 'motion_gate'): 'use_motion_gate',
+        ('filters', 'color_prefilter'): 'use_color_prefilter',
+        ('filters', 'incremental'): 'use_incremental',
+        ('filters', 'tracker'): 'use_tracker',
+        ('telemetry', 'trace'): 'trace_path',
+        ('telemetry', 'metrics_port'): 'metrics_port',
+        ('recording', 'path'): 'record_path',
+        ('recording', 'mode'): 'record_mode'
+    }
+    # Settings baked into the compiled templates
+    TEMPLATE_SETTINGS = ('downscale_factor', 'use_multiscale', 'scales')
+
+    def __init__(self, callback_update_ui=None, config=None):
         self.running = False
         self.paused = False
         self.monitor_index = 1
@@ -28,41 +63,172 @@ class SunClickerBot:
         self.headless = True
         self.confidence_threshold = 0.70
         self.callback_update_ui = callback_update_ui
+        
+        # Pluggable capture: anything mss-like with advance() (see sun_io)
+        self.capture_source_factory = ScreenCapture
         self.lock = threading.Lock()
         
         # Multiple templates support
         self.templates = []  # List of template dicts
         
-        self.click_cooldown = 0.05
-        self.last_click_time = 0
-        self.click_positions = deque(maxlen=10)
-        self.duplicate_threshold = 30
+        # Recent clicks in a spatial hash: within 30 px in the last 0.5 s is a duplicate
+        self.click_history = ClickHistory(radius=30, window=0.5)
+        
+        # Track suns across frames: predictive aiming and per-sun re-click suppression
+        self.use_tracker = True
+        self.tracker = SunTracker(gate_distance=60, max_age=0.5)
         
-        self.frame_skip = 2  # Process every 2nd frame
+        # Sleep until each frame deadline; rate adapts to measured frame times
+        self.scheduler = FrameScheduler(target_fps=30.0, min_fps=5.0,
+                                        cpu_budget=0.5, max_latency=0.15)
         self.frame_counter = 0
         
         self.downscale_factor = 0.75  # Process at 75% size, 44% faster
         
         self.early_exit = True
         
+        # Multi-sun detection: every peak above threshold, merged with NMS
+        self.multi_detect = True
+        self.nms_overlap = 0.3
+        self.max_clicks_per_frame = 5
+        
         self.use_roi = False
-        self.roi = None  # (x, y, w, h) - set this to game window area if known
+        self.roi = None  # (x, y, w, h) in monitor coordinates - only this area is captured
+        
+        # Find the playfield automatically (set auto_roi = False to use a hand-entered roi)
+        self.auto_roi = True
+        self.playfield_locator = PlayfieldLocator(
+            anchor_path=resource_path(os.path.join('resources', 'playfield_anchor.png')),
+            revalidate_interval=5.0)
+        
+        # Per-stage timers and histograms (capture, convert, match,
+        # match:<template>, detect, click, render). Optionally traced to a
+        # CSV/JSONL file and served on http://127.0.0.1:<metrics_port>/metrics
+        self.telemetry = Telemetry()
+        self.trace_path = None
+        self.metrics_port = None
         
+        # Session recording (see session_recorder): frames, detections, clicks
+        # and stage timings streamed to record_path by a background writer
+        self.record_path = None
+        self.record_mode = 'gray'  # Downscaled gray frames, or 'crop' for full captures
+        self.recorder = None
+        
+        # Template matching backend: 'auto' times serial / thread / tiled /
+        # process backends per workload and keeps the fastest
         self.use_parallel = True
-        self.thread_pool = ThreadPoolExecutor(max_workers=3)
+        self.max_workers = 3
+        self.matching_backend = create_backend('auto', self.max_workers, self.telemetry)
+        self.serial_backend = SerialBackend(self.telemetry)  # Used when use_parallel is off
+        
+        # Capture / detect / click on separate threads joined by bounded queues
+        self.use_pipeline = True
+        self.frame_queue = FrameQueue(maxsize=1)
+        self.telemetry.stage('detect').queue = self.frame_queue
+        
+        # Clicks run on their own executor, nearest-neighbour ordered; its
+        # sink is pluggable (click_dispatcher.sink) for tests and replays
+        self.click_dispatcher = ClickDispatcher(min_interval=0.05, max_age=0.25,
+                                                telemetry=self.telemetry)
+        self.click_dispatcher.resolve = self.resolve_click
+        self.click_dispatcher.on_click = self.record_click
+        
+        # OPTIMIZATION: Debug view drawn on its own thread from a half-size
+        # copy, at most 15 times a second
+        self.debug_renderer = DebugRenderer(max_fps=15.0, scale=0.5, telemetry=self.telemetry)
+        
+        # OPTIMIZATION: Preallocated frame buffers, no per-frame allocation
+        self.frame_buffers = FrameBufferRing(size=4)
         
+        # Skip matching on frames that did not change (see MotionGate)
+        self.use_motion_gate = False
+        self.motion_gate = MotionGate(scale=0.25, refresh_interval=1.0)
+        
+        # Only verify templates around yellow blobs (see ColorPrefilter)
+        self.use_color_prefilter = False
+        self.color_prefilter = ColorPrefilter(step=4, min_area=20)
+        
+        # Keep each template's response map between frames and re-match only
+        # the tiles that changed (whole-frame matching only)
+        self.use_incremental = False
+        self.tile_tracker = TileChangeTracker(tile_size=32)
+        
+        # Coarse-to-fine matching over several template scales
         self.use_multiscale = False
-        self.scales = [1.0]
+        self.scales = [0.8, 0.9, 1.0, 1.1, 1.25]
+        self.coarse_margin = 0.15  # Coarse level accepts confidence - margin
+        self.coarse_min_size = 10  # Skip the coarse level for smaller templates
+        self.max_coarse_candidates = 20  # Per template variant and region
+        self.template_padding = (0, 0)  # Largest variant (w, h), set when loading
+        
+        # OPTIMIZATION: Compiled templates are cached on disk and memory-mapped
+        # at startup. Matching can reuse their precomputed statistics, which
+        # pays off when many templates are matched per frame (early_exit off)
+        self.template_bank = TemplateBank(cache_dir=default_cache_dir())
+        self.use_template_stats = False
         
         # Performance metrics
-        self.fps_counter = deque(maxlen=30)
+        self.work_counter = deque(maxlen=30)  # Detection stage time
+        self.latency_counter = deque(maxlen=30)  # Capture to detection done
         self.clicks_counter = 0
         self.detections_by_template = {}
-        self.template_priorities = {}  # Track performance to prioritize templates
+        
+        # Match only the likeliest templates (decayed hit rate and recency)
+        # plus a round-robin exploration slot, however many are loaded
+        self.template_scheduler = TemplateScheduler(top_k=3, explore_slots=1)
+        
+        # Profile overrides, applied before the templates are compiled
+        if config:
+            self.apply_config(config, reload=False)
         
         # Load all templates
         self.load_templates()
 
+    def apply_config(self, config, reload=True):
+        # Apply a profile dict ({section: {key: value}}); unknown keys are
+        # reported and ignored. Returns True if the templates were rebuilt.
+        before = {name: getattr(self, name) for name in self.TEMPLATE_SETTINGS}
+        for section, values in config.items():
+            if not isinstance(values, dict):
+                print(f"Config: ignoring '{section}' (expected a section)")
+                continue
+            for key, value in values.items():
+                attribute = self.CONFIG_ATTRIBUTES.get((section, key))
+                if attribute is not None:
+                    setattr(self, attribute, value)
+                elif (section, key) == ('capture', 'roi'):
+                    continue  # Handled below, so it wins over auto_roi in any order
+                elif section == 'capture' and key in ('target_fps', 'min_fps', 'cpu_budget', 'max_latency'):
+                    setattr(self.scheduler, key, value)
+                    if key == 'target_fps':
+                        self.scheduler.fps = value
+                elif section == 'matching' and key in ('backend', 'workers'):
+                    continue  # Handled below, once both are known
+                else:
+                    print(f"Config: unknown setting {section}.{key}")
+        
+        capture = config.get('capture', {})
+        if isinstance(capture, dict) and 'roi' in capture:
+            # Fixed ROI in monitor coordinates; turns off playfield detection
+            self.roi = tuple(capture['roi']) if capture['roi'] else None
+            self.use_roi = self.roi is not None
+            self.auto_roi = self.auto_roi and self.roi is None
+        
+        matching = config.get('matching', {})
+        if 'backend' in matching or 'workers' in matching:
+            workers = matching.get('workers', self.max_workers)
+            self.use_parallel = workers > 0
+            self.max_workers = max(1, workers)
+            self.matching_backend.close()
+            self.matching_backend = create_backend(matching.get('backend', 'auto'),
+                                                   self.max_workers, self.telemetry)
+            self.matching_backend.load(self.templates)
+        
+        changed = any(getattr(self, name) != before[name] for name in self.TEMPLATE_SETTINGS)
+        if reload and changed:
+            self.reload_templates()
+        return reload and changed
+
     def load_templates(self):
         patterns = [
             'sun.png',
@@ -76,8 +242,9 @@ class SunClickerBot:
             files = glob.glob(os.path.join(self.sun_images_dir, pattern))
             template_files.extend(files)
         
-        # Remove duplicates
-        template_files = list(set(template_files))
+        # Remove duplicates; sorted because load order breaks the template
+        # scheduler's cold-start ties (set order varies between runs)
+        template_files = sorted(set(template_files))
         
         if not template_files:
             print("Error: No sun template images found!")
@@ -87,39 +254,34 @@ class SunClickerBot:
         
         print(f"Found {len(template_files)} template image(s):")
         
+        scales = self.scales if self.use_multiscale else [1.0]
+        self.template_bank.hits = self.template_bank.misses = 0
         for filepath in template_files:
-            template_bgr = cv2.imread(filepath, cv2.IMREAD_COLOR)
-            if template_bgr is None:
-                print(f"  [X] Failed to load: {os.path.basename(filepath)}")
-                continue
-            
-            # OPTIMIZATION: Preprocess templates at multiple scales
-            template_gray = cv2.cvtColor(template_bgr, cv2.COLOR_BGR2GRAY)
-            
-            # OPTIMIZATION: Pre-downscale template to match processing scale
-            if self.downscale_factor != 1.0:
-                template_gray_scaled = cv2.resize(template_gray, None, 
-                                                  fx=self.downscale_factor, 
-                                                  fy=self.downscale_factor,
-                                                  interpolation=cv2.INTER_AREA)
-            else:
-                template_gray_scaled = template_gray
-            
-            h, w = template_gray_scaled.shape[:2]
             name = os.path.basename(filepath)
             
-            self.templates.append({
-                'bgr': template_bgr,
-                'gray': template_gray_scaled,  # Use scaled version
-                'name': name,
-                'width': w,
-                'height': h,
-                'priority': 0  # Will be updated based on success rate
-            })
+            # OPTIMIZATION: Pre-downscale template to match processing scale,
+            # once per matching scale, plus a half-size copy for the coarse
+            # level (compiled once, then loaded from the template bank)
+            variants = self.template_bank.variants(filepath, name, self.downscale_factor,
+                                                   scales, self.coarse_min_size)
+            if not variants:
+                print(f"  [X] Failed to load: {name}")
+                continue
+            base = min(variants, key=lambda v: abs(v['scale'] - 1.0))
+            
+            template_info = dict(base)
+            template_info['variants'] = variants
+            self.templates.append(template_info)
             
             self.detections_by_template[name] = 0
-            self.template_priorities[name] = 0
-            print(f"  [+] Loaded: {name} ({w}x{h})")
+            print(f"  [+] Loaded: {name} ({base['width']}x{base['height']}, {len(variants)} scale(s))")
+        
+        self.template_bank.save()
+        
+        if self.templates:
+            all_variants = [v for t in self.templates for v in t['variants']]
+            self.template_padding = (max(v['width'] for v in all_variants),
+                                     max(v['height'] for v in all_variants))
         
         if not self.templates:
             print("Error: No valid template images could be loaded!")
@@ -127,32 +289,44 @@ class SunClickerBot:
             print(f"\nTotal templates loaded: {len(self.templates)}")
             print(f"Optimizations enabled:")
             print(f"  - Downscale factor: {self.downscale_factor}")
-            print(f"  - Frame skip: {self.frame_skip}")
+            print(f"  - Target FPS: {self.scheduler.target_fps} (CPU budget {self.scheduler.cpu_budget:.0%})")
             print(f"  - Early exit: {self.early_exit}")
-            print(f"  - Parallel processing: {self.use_parallel}")
+            print(f"  - Parallel processing: {self.use_parallel} ({self.matching_backend.name} backend)")
+            print(f"  - Template cache: {self.template_bank.hits} cached, "
+                  f"{self.template_bank.misses} compiled variant(s)")
+        
+        # Backends that cache templates (worker processes) must pick up the new set
+        self.template_scheduler.set_templates(self.templates)
+        self.matching_backend.load(self.templates)
 
-    def match_template_worker(self, frame_gray, template_info):
-        #Worker function for parallel template matching
-        try:
-            result = cv2.matchTemplate(frame_gray, template_info['gray'], cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            
-            if max_val >= self.confidence_threshold:
-                return {
-                    'found': True,
-                    'confidence': max_val,
-                    'location': max_loc,
-                    'template': template_info['name'],
-                    'width': template_info['width'],
-                    'height': template_info['height']
-                }
-        except Exception as e:
-            print(f"Error matching template {template_info['name']}: {e}")
-        
-        return {'found': False}
+    def reload_templates(self):
+        # Rebuild templates after changing downscale_factor, scales or use_multiscale
+        self.templates = []
+        self.load_templates()
+
+    def match_params(self):
+        # Settings the (possibly out-of-process) matching functions need
+        return {
+            'threshold': self.confidence_threshold,
+            'multi_detect': self.multi_detect,
+            'coarse_margin': self.coarse_margin,
+            'max_coarse_candidates': self.max_coarse_candidates,
+            'template_padding': self.template_padding,
+            # Keys per-frame caches (patch statistics, incremental response maps)
+            'frame_id': self.frame_counter,
+            'template_stats': self.use_template_stats,
+            'tile_changes': None,
+            'tile_size': self.tile_tracker.tile_size
+        }
 
     def start(self):
         if not self.running:
+            if self.trace_path:
+                self.telemetry.open_trace(self.trace_path)
+            if self.metrics_port is not None:
+                self.telemetry.start_server(self.metrics_port)
+            if self.record_path:
+                self.start_recording(self.record_path)
             self.running = True
             self.thread = threading.Thread(target=self.run_loop, daemon=True)
             self.thread.start()
@@ -164,16 +338,49 @@ class SunClickerBot:
             self.thread.join(timeout=1.0)
         
         # Cleanup thread pool
-        if self.use_parallel:
-            self.thread_pool.shutdown(wait=False)
+        self.matching_backend.close()
+        self.stop_recording()
+        self.telemetry.close()
         
         print("Bot stopped.")
         
+        # Print per-stage throughput
+        print("\n=== Pipeline Stages ===")
+        for name, stats in sorted(self.telemetry.stages.items()):
+            print(f"  {stats.summary()}")
+        latency = self.click_dispatcher.latency_summary()
+        if latency:
+            print(f"  detection-to-click: p50 {latency['p50_ms']:.1f} ms, p90 {latency['p90_ms']:.1f} ms")
+        
         # Print detection stats
         if self.detections_by_template:
             print("\n=== Detection Statistics ===")
             for name, count in sorted(self.detections_by_template.items(), key=lambda x: x[1], reverse=True):
                 print(f"  {name}: {count} detections")
+        
+        print("\n=== Template Schedule ===")
+        for name, priority, hits, runs in self.template_scheduler.summary(time.time()):
+            print(f"  {name}: priority {priority:.2f}, hit {hits}/{runs} frames")
+
+    def start_recording(self, path):
+        self.stop_recording()
+        self.recorder = SessionRecorder(path, mode=self.record_mode, telemetry=self.telemetry)
+        self.recorder.start({
+            'downscale_factor': self.downscale_factor,
+            'confidence_threshold': self.confidence_threshold,
+            'templates': [t['name'] for t in self.templates],
+            'monitor_index': self.monitor_index
+        })
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def processing_fps(self):
+        # Frames per second detection could sustain at its recent per-frame cost
+        avg_ms = self.telemetry.stage('detect').avg_ms
+        return 1000.0 / avg_ms if avg_ms > 0 else 0.0
 
     def toggle_pause(self):
         with self.lock:
@@ -184,8 +391,8 @@ class SunClickerBot:
             self.callback_update_ui()
 
     def cycle_monitor(self):
-        with mss.mss() as sct:
-            num_monitors = len(sct.monitors)
+        with self.capture_source_factory() as source:
+            num_monitors = len(source.monitors)
             if num_monitors <= 2:
                 return
 
@@ -199,176 +406,302 @@ class SunClickerBot:
         if self.callback_update_ui:
             self.callback_update_ui()
 
+    def get_capture_region(self, monitor):
+        # Region handed to sct.grab: the ROI (clipped to the monitor) or the whole monitor
+        if not (self.use_roi and self.roi):
+            return monitor
+        
+        x, y, w, h = self.roi
+        x = max(0, min(int(x), monitor['width'] - 1))
+        y = max(0, min(int(y), monitor['height'] - 1))
+        w = max(1, min(int(w), monitor['width'] - x))
+        h = max(1, min(int(h), monitor['height'] - y))
+        return {
+            'left': monitor['left'] + x,
+            'top': monitor['top'] + y,
+            'width': w,
+            'height': h
+        }
+
     def is_duplicate_click(self, x, y):
         # Check if we recently clicked near this position
-        for prev_x, prev_y, prev_time in self.click_positions:
-            distance = np.sqrt((x - prev_x)**2 + (y - prev_y)**2)
-            if distance < self.duplicate_threshold and (time.time() - prev_time) < 0.5:
-                return True
-        return False
+        return self.click_history.contains(x, y)
+
+    def capture_frame(self, source):
+        # Stage 1: grab the game region from the selected monitor
+        # Returns None when the source has no more frames (end of a replay)
+        start = time.perf_counter()
+        if not source.advance():
+            return None
+        
+        with self.lock:
+            current_monitor_idx = self.monitor_index
+            is_paused = self.paused
+            headless_mode = self.headless
+
+        monitor = source.monitors[min(current_monitor_idx, len(source.monitors) - 1)]
+        if self.auto_roi:
+            self.roi = self.playfield_locator.get_roi(source, current_monitor_idx, monitor)
+            self.use_roi = self.roi is not None
+        region = self.get_capture_region(monitor)
+        frame_bgra = source.grab(region)
+
+        duration = time.perf_counter() - start
+        now = time.time()
+        self.telemetry.record('capture', duration, now)
+        # Recordings replay with their original capture times, so tracking
+        # and scheduling see the recorded motion at any replay speed
+        frame_time = getattr(source, 'frame_time', None)
+        return {
+            'frame_bgra': frame_bgra,
+            'frame_gray': None,  # Set once detection has converted the frame
+            'region': region,
+            'timestamp': now if frame_time is None else frame_time,  # Frame clock
+            'captured_at': now,  # Wall clock, for latencies
+            'paused': is_paused,
+            'headless': headless_mode,
+            'matches': [],
+            'timings': {'capture': duration}  # Seconds per stage, for the recorder
+        }
+
+    def detect_frame(self, packet):
+        # Stage 2: template matching on the downscaled gray frame
+        if packet['paused']:
+            return []
+
+        padding = self.template_padding
+        
+        # OPTIMIZATION: Cheap color mask first; no yellow means no suns
+        candidates = None
+        if self.use_color_prefilter:
+            candidates = self.color_prefilter.regions(packet['frame_bgra'], self.downscale_factor, padding)
+            if not candidates:
+                return []
+
+        # OPTIMIZATION: Single BGRA->gray pass on the captured region only,
+        # written into preallocated buffers
+        frame_bgra = packet['frame_bgra']
+        buffers = self.frame_buffers.next(frame_bgra.shape, self.downscale_factor)
+        frame_gray = buffers['gray']
+        with self.telemetry.timer('convert') as timer:
+            cv2.cvtColor(frame_bgra, cv2.COLOR_BGRA2GRAY, dst=buffers['gray_full'])
+            if self.downscale_factor != 1.0:
+                cv2.resize(buffers['gray_full'], (frame_gray.shape[1], frame_gray.shape[0]), 
+                           dst=frame_gray, interpolation=cv2.INTER_AREA)
+        packet['frame_gray'] = frame_gray
+        packet['timings']['convert'] = timer.duration
+        
+        # OPTIMIZATION: Only match where the frame changed (None = everywhere)
+        regions = [None]
+        if self.use_motion_gate:
+            changed = self.motion_gate.regions(frame_gray, padding, packet['timestamp'])
+            if changed is not None:
+                if not changed:
+                    return []
+                regions = changed
+        
+        # Verify templates only on color candidates (that also moved, if gated)
+        if candidates is not None:
+            if regions != [None]:
+                candidates = [c for c in candidates if any(boxes_overlap(c, r) for r in regions)]
+                if not candidates:
+                    return []
+            regions = candidates
+        
+        # OPTIMIZATION: Half-resolution level for the coarse-to-fine search
+        # (not needed when cached response maps are updated incrementally)
+        incremental = self.use_incremental and regions == [None]
+        coarse_gray = None
+        if self.use_multiscale and not incremental:
+            coarse_gray = buffers['coarse']
+            cv2.pyrDown(frame_gray, dst=coarse_gray)
+        
+        # OPTIMIZATION: Only the few templates most likely to hit this frame
+        selected = self.template_scheduler.select(packet['timestamp'])
+        
+        params = self.match_params()
+        if incremental:
+            # OPTIMIZATION: Re-match only tiles that changed since each cached response map
+            params['tile_changes'] = self.tile_tracker.update(frame_gray, self.frame_counter)
+        
+        backend = self.matching_backend if self.use_parallel else self.serial_backend
+        with self.telemetry.timer('match') as timer:
+            best_matches = backend.match(frame_gray, coarse_gray, selected, regions,
+                                         params, self.early_exit)
+        packet['timings']['match'] = timer.duration
+        self.template_scheduler.observe(selected, best_matches, packet['timestamp'], self.early_exit)
+        
+        # Merge overlapping hits from all templates into one per sun
+        if self.multi_detect:
+            best_matches = non_max_suppression(best_matches, self.nms_overlap)
+        
+        # Sort by confidence, keep the top matches and work out where to click
+        best_matches.sort(key=lambda x: x['confidence'], reverse=True)
+        best_matches = best_matches[:self.max_clicks_per_frame]
+        
+        scale_factor = 1.0 / self.downscale_factor
+        region = packet['region']
+        for match in best_matches:
+            center_x = int((match['location'][0] + match['width'] // 2) * scale_factor)
+            center_y = int((match['location'][1] + match['height'] // 2) * scale_factor)
+            # Captured region already includes the ROI offset
+            match['click'] = (region['left'] + center_x, region['top'] + center_y)
+        
+        packet['matches'] = best_matches
+        return best_matches
+
+    def process_frame(self, packet):
+        # Detection plus frame timing bookkeeping
+        start = time.perf_counter()
+        self.frame_counter += 1
+        self.detect_frame(packet)
+        if self.use_tracker:
+            self.tracker.update(packet['matches'], packet['timestamp'])
+
+        duration = time.perf_counter() - start
+        now = time.time()
+        # Only the detection stage is CPU work; the latency also counts queue wait
+        self.work_counter.append(duration)
+        self.latency_counter.append(now - packet['captured_at'])
+        self.scheduler.adapt(self.work_counter, self.latency_counter)
+        self.telemetry.record('detect', duration, now)
+        packet['timings']['detect'] = duration
+        
+        # Recording copies what it needs and queues it; writing is off this thread
+        recorder = self.recorder
+        if recorder is not None and not packet['paused']:
+            recorder.record_frame(packet, self.downscale_factor)
+
+    def queue_clicks(self, packet):
+        # Stage 3: hand this frame's suns to the click dispatcher
+        if not packet['matches']:
+            return
+        detected_at = time.time()
+        self.click_dispatcher.submit([{
+            'x': match['click'][0],
+            'y': match['click'][1],
+            'captured_at': packet['captured_at'],
+            'detected_at': detected_at,
+            'track_id': match.get('track_id') if self.use_tracker else None,
+            'template': match['template'],
+            'confidence': match['confidence']
+        } for match in packet['matches']])
+
+    def resolve_click(self, target):
+        # Dispatcher hook: where to click, or None if the sun was already handled
+        track_id = target['track_id']
+        
+        # Suppress re-clicks per tracked sun, or by distance without a tracker
+        if track_id is not None:
+            if not self.tracker.should_click(track_id, time.time()):
+                return None
+            # Aim where the sun will be when the click lands
+            return self.tracker.predict_click(track_id) or (target['x'], target['y'])
+        
+        if self.is_duplicate_click(target['x'], target['y']):
+            return None
+        return (target['x'], target['y'])
+
+    def record_click(self, target, position, click_time):
+        # Dispatcher hook: bookkeeping after each click
+        abs_x, abs_y = position
+        if target['track_id'] is not None:
+            self.tracker.mark_clicked(target['track_id'], click_time, target['captured_at'])
+        self.clicks_counter += 1
+        self.detections_by_template[target['template']] += 1
+        
+        # Record click
+        self.click_history.add(abs_x, abs_y, click_time)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record_click(target, position, click_time)
+        
+        print(f"Clicked sun at ({abs_x}, {abs_y}) - {target['template']} - conf: {target['confidence']:.3f}")
+
+    def render_debug(self, packet):
+        # Hand the frame to the debug renderer if it is due for one; returns
+        # False once 'q' was pressed in the debug window
+        renderer = self.debug_renderer
+        renderer.enabled = not packet['headless']
+        if renderer.wants_frame():
+            renderer.post(packet['frame_bgra'], packet['matches'], packet['paused'],
+                          self.debug_overlay(), self.downscale_factor)
+        return not renderer.quit_requested
+
+    def debug_overlay(self):
+        stage_text = " | ".join(f"{name} {self.telemetry.stage(name).rate:.0f}/s"
+                               for name in ('capture', 'detect', 'click'))
+        return [
+            f"FPS: {self.processing_fps():.1f} | Clicks: {self.clicks_counter}",
+            f"Templates: {len(self.templates)} | Target: {self.scheduler.fps:.0f} fps | Scale: {self.downscale_factor}",
+            stage_text
+        ]
 
     def run_loop(self):
-        window_created = False
-        
-        with mss.mss() as sct:
-            try:
-                while self.running:
-                    frame_start = time.time()
-                    
-                    if not self.templates:
-                        time.sleep(1)
-                        continue
-
-                    self.frame_counter += 1
-                    if self.frame_counter % self.frame_skip != 0:
-                        time.sleep(0.001)
-                        continue
-
-                    with self.lock:
-                        current_monitor_idx = self.monitor_index
-                        is_paused = self.paused
-                        headless_mode = self.headless
-
-                    # Window management
-                    if not headless_mode and not window_created:
-                        cv2.namedWindow("PVZ Bot View", cv2.WINDOW_NORMAL)
-                        cv2.resizeWindow("PVZ Bot View", 960, 540)
-                        window_created = True
-                    elif headless_mode and window_created:
-                        cv2.destroyWindow("PVZ Bot View")
-                        window_created = False
-
-                    monitor = sct.monitors[current_monitor_idx]
-                    sct_img = sct.grab(monitor)
-                    
-                    # Convert to numpy array and BGR
-                    frame_bgra = np.array(sct_img)
-                    frame_bgr = cv2.cvtColor(frame_bgra, cv2.COLOR_BGRA2BGR)
-
-                    if is_paused:
-                        if not headless_mode:
-                            cv2.putText(frame_bgr, "PAUSED", (50, 50), 
-                                      cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    else:
-                        if self.downscale_factor != 1.0:
-                            frame_gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
-                            frame_gray = cv2.resize(frame_gray, None, 
-                                                   fx=self.downscale_factor, 
-                                                   fy=self.downscale_factor,
-                                                   interpolation=cv2.INTER_AREA)
-                        else:
-                            frame_gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
-                        
-                        if self.use_roi and self.roi:
-                            x, y, w, h = self.roi
-                            frame_gray = frame_gray[y:y+h, x:x+w]
-                        
-                        sorted_templates = sorted(self.templates, 
-                                                key=lambda t: self.template_priorities.get(t['name'], 0), 
-                                                reverse=True)
-                        
-                        best_matches = []
-
-                        if self.use_parallel and len(sorted_templates) > 2:
-                            # Parallel processing for multiple templates
-                            futures = []
-                            for template_info in sorted_templates:
-                                future = self.thread_pool.submit(
-                                    self.match_template_worker, 
-                                    frame_gray, 
-                                    template_info
-                                )
-                                futures.append(future)
-                            
-                            for future in as_completed(futures):
-                                result = future.result()
-                                if result['found']:
-                                    best_matches.append(result)
-                                    if self.early_exit:
-                                        break
-                        else:
-                            # Sequential processing (faster for 1-2 templates)
-                            for template_info in sorted_templates:
-                                result = self.match_template_worker(frame_gray, template_info)
-                                if result['found']:
-                                    best_matches.append(result)
-                                    if self.early_exit:
-                                        break
-                        
-                        # Sort by confidence and click
-                        best_matches.sort(key=lambda x: x['confidence'], reverse=True)
-                        
-                        for match in best_matches[:5]:  # Process top 5 matches max
-                            current_time = time.time()
-                            
-                            if current_time - self.last_click_time < self.click_cooldown:
-                                break
-                            
-                            scale_factor = 1.0 / self.downscale_factor
-                            center_x = int((match['location'][0] + match['width'] // 2) * scale_factor)
-                            center_y = int((match['location'][1] + match['height'] // 2) * scale_factor)
-                            
-                            # Adjust for ROI offset if used
-                            if self.use_roi and self.roi:
-                                center_x += self.roi[0]
-                                center_y += self.roi[1]
-                            
-                            abs_x = monitor['left'] + center_x
-                            abs_y = monitor['top'] + center_y
-                            
-                            if self.is_duplicate_click(abs_x, abs_y):
-                                continue
-                            
-                            # Click
-                            pyautogui.click(abs_x, abs_y)
-                            self.clicks_counter += 1
-                            self.detections_by_template[match['template']] += 1
-                            
-                            self.template_priorities[match['template']] = self.template_priorities.get(match['template'], 0) + 1
-                            
-                            # Record click
-                            self.click_positions.append((abs_x, abs_y, current_time))
-                            self.last_click_time = current_time
-                            
-                            print(f"Clicked sun at ({abs_x}, {abs_y}) - {match['template']} - conf: {match['confidence']:.3f}")
-                            
-                            if not headless_mode:
-                                box_x = int(match['location'][0] * scale_factor)
-                                box_y = int(match['location'][1] * scale_factor)
-                                box_w = int(match['width'] * scale_factor)
-                                box_h = int(match['height'] * scale_factor)
-                                
-                                color = (0, 255, 0) if 'sun.png' in match['template'] else (255, 0, 255)
-                                cv2.rectangle(frame_bgr, 
-                                            (box_x, box_y), 
-                                            (box_x + box_w, box_y + box_h), 
-                                            color, 2)
-                                cv2.putText(frame_bgr, 
-                                          f"{match['confidence']:.2f}", 
-                                          (box_x, box_y - 10), 
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                            
-                            time.sleep(0.02)
-
-                    frame_time = time.time() - frame_start
-                    self.fps_counter.append(frame_time)
-                    
-                    if not headless_mode:
-                        # Display stats
-                        avg_fps = 1.0 / (sum(self.fps_counter) / len(self.fps_counter)) if self.fps_counter else 0
-                        cv2.putText(frame_bgr, f"FPS: {avg_fps:.1f} | Clicks: {self.clicks_counter}", 
-                                  (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                        cv2.putText(frame_bgr, f"Templates: {len(self.templates)} | Skip: {self.frame_skip} | Scale: {self.downscale_factor}", 
-                                  (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                        
-                        display_frame = cv2.resize(frame_bgr, (0, 0), fx=0.5, fy=0.5)
-                        cv2.imshow("PVZ Bot View", display_frame)
-                        if cv2.waitKey(1) & 0xFF == ord('q'):
-                            self.running = False
-                            break
-                    
-                    time.sleep(0.001)
-                    
-            finally:
-                if window_created:
-                    cv2.destroyAllWindows()
+        self.click_dispatcher.start()
+        self.debug_renderer.start()
+        try:
+            if self.use_pipeline:
+                self.run_pipeline()
+            else:
+                self.run_sequential()
+        finally:
+            self.debug_renderer.stop()
+            self.click_dispatcher.stop()
+
+    def run_sequential(self):
+        # Capture and detect one after another on this thread
+        with self.capture_source_factory() as source:
+            while self.running:
+                if not self.templates:
+                    time.sleep(1)
+                    continue
+
+                self.scheduler.wait()
+                packet = self.capture_frame(source)
+                if packet is None:
+                    self.running = False
+                    break
+                self.process_frame(packet)
+                self.queue_clicks(packet)
+                
+                if not self.render_debug(packet):
+                    self.running = False
+                    break
+
+    def run_pipeline(self):
+        # Capture runs on its own thread, clicks and the debug view on theirs;
+        # detection runs here. Capture of frame N+1 overlaps detection of frame N.
+        self.frame_queue.clear()
+        
+        capture_thread = threading.Thread(target=self.capture_stage, daemon=True)
+        capture_thread.start()
+        
+        try:
+            while self.running:
+                packet = self.frame_queue.get(timeout=0.1)
+                if packet is None:
+                    continue
+                
+                self.process_frame(packet)
+                self.queue_clicks(packet)
+                
+                if not self.render_debug(packet):
+                    self.running = False
+                    break
+        finally:
+            capture_thread.join(timeout=1.0)
+
+    def capture_stage(self):
+        with self.capture_source_factory() as source:
+            while self.running:
+                if not self.templates:
+                    time.sleep(1)
+                    continue
+                
+                self.scheduler.wait()
+                packet = self.capture_frame(source)
+                if packet is None:
+                    self.running = False
+                    break
+                self.frame_queue.put(packet)
@@ -0,0 +1,104 @@
+import argparse
+import multiprocessing
+import sys
+import time
+
+
+# Command line entry point: runs the bot without Tk or the keyboard module
+# (which needs root on Linux), tuned by a TOML or YAML profile:
+#
+#     python sun_clicker_cli.py --profile profiles/default.toml
+#     python sun_clicker_cli.py --profile fast.toml --bench recordings/level1
+#
+# OpenCV, the bot and the GUI are imported only once the arguments are
+# parsed, and only what the chosen mode needs.
+
+
+def load_profile(path):
+    # {section: {key: value}} from a .toml, .yaml or .yml file
+    if path.lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("YAML profiles need PyYAML (pip install pyyaml), or use a .toml profile")
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise SystemExit("TOML profiles need Python 3.11+ or the tomli package")
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PvZ sun clicker without the GUI")
+    parser.add_argument('--profile', help="TOML or YAML settings profile")
+    parser.add_argument('--bench', metavar='FRAMES',
+                        help="Replay a PNG folder or video through the detector and exit")
+    parser.add_argument('--truth', help="Ground truth JSON for --bench")
+    parser.add_argument('--baseline', action='store_true',
+                        help="With --bench on a session recording, compare against its detections")
+    parser.add_argument('--record', metavar='DIR', help="Record the session (frames, detections, clicks)")
+    parser.add_argument('--report', help="Write the --bench report as JSON")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--dry-run', action='store_true', help="Detect but don't click")
+    parser.add_argument('--debug', action='store_true', help="Show the debug view")
+    parser.add_argument('--gui', action='store_true', help="Open the Tk GUI with this profile")
+    return parser
+
+
+def run_bench(bot, args):
+    from sun_replay import run_bench as replay_bench
+    return replay_bench(bot, args.bench, truth_path=args.truth, baseline=args.baseline,
+                        record=args.record, report_path=args.report)
+
+
+def run_live(bot, args):
+    if args.dry_run:
+        from sun_io import RecordingClickSink
+        bot.click_dispatcher.sink = RecordingClickSink()
+    bot.headless = not args.debug
+    if args.record:
+        bot.record_path = args.record
+
+    bot.start()
+    deadline = time.time() + args.duration if args.duration else None
+    try:
+        while bot.running and (deadline is None or time.time() < deadline):
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bot.stop()
+    return 0
+
+
+def main(argv=None):
+    # Matching worker processes in a frozen (PyInstaller) build must not rerun the app
+    multiprocessing.freeze_support()
+    args = build_parser().parse_args(argv)
+    config = load_profile(args.profile) if args.profile else {}
+
+    start = time.time()
+    from sun_clicker_bot import SunClickerBot
+    bot = SunClickerBot(config=config)
+    if not bot.templates:
+        return 1
+    print(f"Ready in {time.time() - start:.2f}s")
+
+    if args.bench:
+        return run_bench(bot, args)
+    if args.gui:
+        import sun_clicker_gui
+        sun_clicker_gui.main(bot)
+        return 0
+    return run_live(bot, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
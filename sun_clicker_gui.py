@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk
 import keyboard
 import threading
+import multiprocessing
 import os
 import sys
 from sun_clicker_bot import SunClickerBot
@@ -11,7 +12,7 @@ class SunClickerGUI:
         self.root = root
         self.bot = bot
         self.root.title("PVZ Sun Clicker (Optimized)")
-        self.root.geometry("340x520")
+        self.root.geometry("340x680")
         self.root.resizable(False, False)
         
         # Style
@@ -41,6 +42,11 @@ class SunClickerGUI:
         
         self.fps_var = tk.StringVar(value="FPS: 0.0")
         ttk.Label(root, textvariable=self.fps_var).pack(pady=2)
+        
+        # Per-stage p50 / p90 from the bot's telemetry
+        self.stages_var = tk.StringVar(value="")
+        ttk.Label(root, textvariable=self.stages_var, font=("Consolas", 8),
+                  justify='left').pack(pady=2)
 
         # Controls Frame
         controls = ttk.Frame(root)
@@ -57,6 +63,18 @@ class SunClickerGUI:
                        variable=self.early_exit_var, 
                        command=self.toggle_early_exit).pack(anchor='w', pady=5)
 
+        # Motion Gating Checkbox
+        self.motion_gate_var = tk.BooleanVar(value=bot.use_motion_gate)
+        ttk.Checkbutton(controls, text="Motion Gating (Skip static frames)", 
+                       variable=self.motion_gate_var, 
+                       command=self.toggle_motion_gate).pack(anchor='w', pady=5)
+
+        # Color Prefilter Checkbox
+        self.color_prefilter_var = tk.BooleanVar(value=bot.use_color_prefilter)
+        ttk.Checkbutton(controls, text="Color Prefilter (Yellow candidates only)", 
+                       variable=self.color_prefilter_var, 
+                       command=self.toggle_color_prefilter).pack(anchor='w', pady=5)
+
         # Confidence Threshold
         ttk.Label(controls, text="Confidence Threshold:").pack(anchor='w', pady=(10,0))
         self.confidence_var = tk.DoubleVar(value=bot.confidence_threshold)
@@ -87,10 +105,15 @@ class SunClickerGUI:
         self.clicks_var.set(f"Clicks: {self.bot.clicks_counter}")
         self.templates_var.set(f"Templates: {len(self.bot.templates)}")
         
-        # Calculate and display FPS
-        if self.bot.fps_counter:
-            avg_fps = 1.0 / (sum(self.bot.fps_counter) / len(self.bot.fps_counter))
-            self.fps_var.set(f"FPS: {avg_fps:.1f}")
+        # Display FPS and where the frame budget goes
+        self.fps_var.set(f"FPS: {self.bot.processing_fps():.1f}")
+        lines = []
+        for name in ('capture', 'convert', 'match', 'click', 'render_post', 'render'):
+            stats = self.bot.telemetry.stages.get(name)
+            if stats is not None and stats.histogram.count:
+                lines.append(f"{name:>8} p50 {stats.histogram.percentile(50):6.1f} ms"
+                             f"  p90 {stats.histogram.percentile(90):6.1f} ms")
+        self.stages_var.set("\n".join(lines))
         
         self.root.after(500, self.update_info)
 
@@ -101,6 +124,15 @@ class SunClickerGUI:
         self.bot.early_exit = self.early_exit_var.get()
         print(f"Early exit: {'ON' if self.bot.early_exit else 'OFF'}")
 
+    def toggle_motion_gate(self):
+        self.bot.use_motion_gate = self.motion_gate_var.get()
+        self.bot.motion_gate.reset()
+        print(f"Motion gating: {'ON' if self.bot.use_motion_gate else 'OFF'}")
+
+    def toggle_color_prefilter(self):
+        self.bot.use_color_prefilter = self.color_prefilter_var.get()
+        print(f"Color prefilter: {'ON' if self.bot.use_color_prefilter else 'OFF'}")
+
     def toggle_debug(self):
         self.bot.headless = not self.bot.headless
         status = "disabled" if self.bot.headless else "enabled"
@@ -140,12 +172,16 @@ def cleanup():
     root.destroy()
     os._exit(0)
 
-if __name__ == "__main__":
+def main(configured_bot=None):
+    # configured_bot: a bot already set up by sun_clicker_cli from a profile
+    global root, bot
+    # Matching worker processes in a frozen (PyInstaller) build must not rerun the app
+    multiprocessing.freeze_support()
     root = tk.Tk()
     
     # Initialize Bot
     print("Initializing bot...")
-    bot = SunClickerBot()
+    bot = configured_bot or SunClickerBot()
     
     # Initialize GUI
     print("Initializing GUI...")
@@ -167,3 +203,6 @@ if __name__ == "__main__":
         cleanup()
     finally:
         keyboard.unhook_all_hotkeys()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,539 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Per-thread matchTemplate output buffers, keyed by response map shape
+_buffers = threading.local()
+
+# Full-frame response maps kept across frames for incremental matching,
+# keyed by (template name, scale, frame shape). Each variant is matched by
+# one thread (or worker process) at a time, so entries need no locking.
+_response_cache = {}
+
+
+def find_peaks(result, threshold, width, height, template_name=None):
+    # Vectorized extraction of every local maximum above threshold in a
+    # matchTemplate response map (instead of the single minMaxLoc peak)
+    mask = result >= threshold
+    if not mask.any():
+        return []
+
+    # A pixel is a peak if it equals the max of its neighbourhood. The
+    # neighbourhood is half a template so two touching suns stay separate.
+    kernel = np.ones((max(1, height // 2) | 1, max(1, width // 2) | 1), np.uint8)
+    dilated = cv2.dilate(result, kernel)
+    peaks = mask & (result >= dilated)
+
+    ys, xs = np.nonzero(peaks)
+    scores = result[ys, xs]
+
+    return [{
+        'found': True,
+        'confidence': float(score),
+        'location': (int(x), int(y)),
+        'template': template_name,
+        'width': width,
+        'height': height
+    } for x, y, score in zip(xs, ys, scores)]
+
+
+def non_max_suppression(matches, overlap_threshold=0.3):
+    # Greedy NMS across all templates: keep the most confident box and drop
+    # every other box that overlaps it by more than overlap_threshold (IoU)
+    if len(matches) <= 1:
+        return list(matches)
+
+    boxes = np.array([(m['location'][0], m['location'][1], m['width'], m['height'])
+                      for m in matches], dtype=np.float32)
+    scores = np.array([m['confidence'] for m in matches], dtype=np.float32)
+
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = x1 + boxes[:, 2]
+    y2 = y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    order = np.argsort(-scores)
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        inter_w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        inter_h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter)
+
+        order = rest[iou <= overlap_threshold]
+
+    return [matches[i] for i in keep]
+
+
+def merge_boxes(boxes):
+    # Union overlapping (x, y, w, h) boxes until none overlap
+    boxes = [list(b) for b in boxes]
+    merged = True
+    while merged and len(boxes) > 1:
+        merged = False
+        result = []
+        while boxes:
+            x, y, w, h = boxes.pop()
+            i = 0
+            while i < len(boxes):
+                bx, by, bw, bh = boxes[i]
+                if bx <= x + w and x <= bx + bw and by <= y + h and y <= by + bh:
+                    x0, y0 = min(x, bx), min(y, by)
+                    x1, y1 = max(x + w, bx + bw), max(y + h, by + bh)
+                    x, y, w, h = x0, y0, x1 - x0, y1 - y0
+                    boxes.pop(i)
+                    merged = True
+                else:
+                    i += 1
+            result.append([x, y, w, h])
+        boxes = result
+    return [tuple(b) for b in boxes]
+
+
+class MotionGate:
+    # Frame differencing at very low resolution. Tells the detector to skip a
+    # frame that did not change, or to match only around the changed areas.
+
+    def __init__(self, scale=0.25, threshold=20, refresh_interval=1.0, max_changed_fraction=0.4):
+        self.scale = scale
+        self.threshold = threshold  # Gray-level change that counts as motion
+        self.refresh_interval = refresh_interval  # Force a full-frame pass this often (s)
+        self.max_changed_fraction = max_changed_fraction  # Above this, just match everything
+        self.reference = None
+        self.last_full = 0
+        # Preallocated buffers: two small frames (current / reference) and the diff
+        self.buffers = []
+        self.diff = None
+
+    def reset(self):
+        self.reference = None
+
+    def regions(self, frame_gray, padding, now):
+        # Returns None to match the whole frame, [] to skip matching, or a
+        # list of (x, y, w, h) boxes in frame_gray coordinates
+        small_w = max(1, int(round(frame_gray.shape[1] * self.scale)))
+        small_h = max(1, int(round(frame_gray.shape[0] * self.scale)))
+        if not self.buffers or self.buffers[0].shape != (small_h, small_w):
+            self.buffers = [np.empty((small_h, small_w), dtype=np.uint8) for _ in range(2)]
+            self.diff = np.empty((small_h, small_w), dtype=np.uint8)
+            self.reference = None
+        # Write into whichever buffer is not the reference
+        small = self.buffers[1] if self.reference is self.buffers[0] else self.buffers[0]
+        cv2.resize(frame_gray, (small_w, small_h), dst=small, interpolation=cv2.INTER_AREA)
+
+        if (self.reference is None or self.reference.shape != small.shape or
+                now - self.last_full >= self.refresh_interval):
+            self.reference = small
+            self.last_full = now
+            return None
+
+        cv2.absdiff(small, self.reference, dst=self.diff)
+        _, mask = cv2.threshold(self.diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self.diff)
+        changed = cv2.countNonZero(mask)
+        if changed == 0:
+            # Keep the old reference so slow movement still adds up
+            return []
+
+        self.reference = small
+        if changed > self.max_changed_fraction * mask.size:
+            return None
+
+        mask = cv2.dilate(mask, np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+
+        frame_h, frame_w = frame_gray.shape[:2]
+        pad_w, pad_h = padding
+        boxes = []
+        for x, y, w, h, _ in stats[1:count]:
+            x0 = max(0, int(x / self.scale) - pad_w)
+            y0 = max(0, int(y / self.scale) - pad_h)
+            x1 = min(frame_w, int((x + w) / self.scale) + pad_w)
+            y1 = min(frame_h, int((y + h) / self.scale) + pad_h)
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+
+        return merge_boxes(boxes)
+
+
+def boxes_overlap(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+class ColorPrefilter:
+    # Proposes sun candidates from a yellow color mask so template matching
+    # only runs on small patches around them. Works on a strided sample of
+    # the captured BGRA frame, before any gray conversion.
+
+    def __init__(self, step=4, min_area=20):
+        self.step = step  # Sample every step-th pixel of the captured frame
+        self.min_area = min_area  # Smallest blob, in sampled pixels
+        # Sun yellow as a BGRA box: high red and green, moderate blue
+        self.lower = np.array([0, 170, 200, 0], dtype=np.uint8)
+        self.upper = np.array([170, 255, 255, 255], dtype=np.uint8)
+        self.sample = None
+        self.mask = None
+
+    def regions(self, frame_bgra, downscale_factor, padding):
+        # Candidate (x, y, w, h) boxes in downscaled frame coordinates
+        strided = frame_bgra[::self.step, ::self.step]
+        if self.sample is None or self.sample.shape != strided.shape:
+            self.sample = np.empty(strided.shape, dtype=np.uint8)
+            self.mask = np.empty(strided.shape[:2], dtype=np.uint8)
+        np.copyto(self.sample, strided)
+        mask = cv2.inRange(self.sample, self.lower, self.upper, dst=self.mask)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+
+        frame_h = int(frame_bgra.shape[0] * downscale_factor)
+        frame_w = int(frame_bgra.shape[1] * downscale_factor)
+        scale = self.step * downscale_factor
+        pad_w, pad_h = padding
+
+        boxes = []
+        for x, y, w, h, area in stats[1:count]:
+            if area < self.min_area:
+                continue
+            x0 = max(0, int(x * scale) - pad_w)
+            y0 = max(0, int(y * scale) - pad_h)
+            x1 = min(frame_w, int((x + w) * scale) + pad_w)
+            y1 = min(frame_h, int((y + h) * scale) + pad_h)
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+
+        return merge_boxes(boxes)
+
+
+class TileChangeTracker:
+    # Remembers, for each tile of the frame, the id of the last frame in
+    # which any of its pixels changed. A response map computed at frame N
+    # only needs re-matching where tiles changed after N.
+
+    def __init__(self, tile_size=32):
+        self.tile_size = tile_size
+        self.previous = None
+        self.diff = None
+        self.last_changed = None
+
+    def reset(self):
+        self.previous = None
+
+    def update(self, frame_gray, frame_id):
+        # Returns the (rows, cols) grid of last-changed frame ids
+        if self.previous is None or self.previous.shape != frame_gray.shape:
+            h, w = frame_gray.shape[:2]
+            rows = -(-h // self.tile_size)
+            cols = -(-w // self.tile_size)
+            self.previous = frame_gray.copy()
+            self.diff = np.empty_like(frame_gray)
+            self.last_changed = np.full((rows, cols), frame_id, dtype=np.int64)
+            return self.last_changed
+
+        cv2.absdiff(frame_gray, self.previous, dst=self.diff)
+        starts_y = np.arange(0, frame_gray.shape[0], self.tile_size)
+        starts_x = np.arange(0, frame_gray.shape[1], self.tile_size)
+        tile_max = np.maximum.reduceat(np.maximum.reduceat(self.diff, starts_y, axis=0), starts_x, axis=1)
+        self.last_changed[tile_max > 0] = frame_id
+        np.copyto(self.previous, frame_gray)
+        return self.last_changed
+
+
+# Matching functions are module level (no bot state) so they can run in
+# worker processes as well as threads. params carries the bot settings:
+# threshold, multi_detect, coarse_margin, max_coarse_candidates, frame_id,
+# template_stats (use the precomputed-statistics path) and, for incremental
+# matching, tile_changes / tile_size from a TileChangeTracker.
+
+def response_buffer(patch, template_gray):
+    # Reusable float32 response map for matchTemplate's result= argument
+    shape = (patch.shape[0] - template_gray.shape[0] + 1, patch.shape[1] - template_gray.shape[1] + 1)
+    cache = getattr(_buffers, 'responses', None)
+    if cache is None or len(cache) > 32:
+        # Region sizes vary with motion gating; don't let the cache grow forever
+        cache = _buffers.responses = {}
+    buffer = cache.get(shape)
+    if buffer is None:
+        buffer = cache[shape] = np.empty(shape, dtype=np.float32)
+    return buffer
+
+
+def window_statistics(patch, size, key, frame_id):
+    # Sum and sqrt(n * variance) of every size=(w, h) window of a patch,
+    # computed once per frame and shared by all templates of that size
+    cache = getattr(_buffers, 'windows', None)
+    if cache is None or cache['frame_id'] != frame_id:
+        cache = _buffers.windows = {'frame_id': frame_id, 'patches': {}, 'sizes': {}}
+
+    stats = cache['sizes'].get((key, size))
+    if stats is None:
+        squares = cache['patches'].get(key)
+        if squares is None:
+            patch_f32 = patch.astype(np.float32)
+            squares = cache['patches'][key] = (patch_f32, cv2.multiply(patch_f32, patch_f32))
+        w, h = size
+        out_h, out_w = patch.shape[0] - h + 1, patch.shape[1] - w + 1
+        # Box sums anchored at the window's top-left corner, like matchTemplate
+        sums, sq_sums = [cv2.boxFilter(image, -1, size, anchor=(0, 0), normalize=False,
+                                       borderType=cv2.BORDER_CONSTANT)[:out_h, :out_w]
+                         for image in squares]
+        deviation = cv2.scaleAdd(cv2.multiply(sums, sums), -1.0 / (w * h), sq_sums)
+        deviation = cv2.sqrt(cv2.max(deviation, 0))
+        stats = cache['sizes'][(key, size)] = (sums, deviation)
+    return stats
+
+
+def match_response(patch, template, stats=None, key=None, frame_id=None):
+    # TM_CCOEFF_NORMED response map of one template. With the template's
+    # precomputed mean and norm (see template_bank) this is a plain 8-bit
+    # cross-correlation, corrected with window statistics that templates
+    # of the same size share within a frame.
+    result = response_buffer(patch, template)
+    if stats is None or frame_id is None:
+        return cv2.matchTemplate(patch, template, cv2.TM_CCOEFF_NORMED, result=result)
+
+    mean, norm = stats
+    h, w = template.shape[:2]
+    sums, deviation = window_statistics(patch, (w, h), key, frame_id)
+    cv2.matchTemplate(patch, template, cv2.TM_CCORR, result=result)
+    # sum((I - mean_I) * (T - mean_T)) == sum(I * T) - mean_T * sum(I)
+    cv2.scaleAdd(sums, -mean, result, dst=result)
+    denominator = deviation * norm
+
+    # Flat windows (or a flat template) correlate with nothing
+    flat = denominator <= 1e-3 * max(norm, 1.0)
+    cv2.divide(result, denominator, dst=result)
+    result[flat] = 0
+    return np.clip(result, -1.0, 1.0, out=result)
+
+
+def crop_region(frame_gray, template_info, region):
+    # Sub-image to match in plus its offset; None if the template won't fit
+    x0, y0 = 0, 0
+    if region is not None:
+        x0, y0, w, h = region
+        frame_gray = frame_gray[y0:y0 + h, x0:x0 + w]
+
+    if frame_gray.shape[0] < template_info['height'] or frame_gray.shape[1] < template_info['width']:
+        return None, x0, y0
+    return frame_gray, x0, y0
+
+
+def match_template_best(frame_gray, template_info, threshold, region=None, frame_id=None):
+    # Single best match of one template (the original minMaxLoc behaviour)
+    try:
+        patch, x0, y0 = crop_region(frame_gray, template_info, region)
+        if patch is None:
+            return []
+        result = match_response(patch, template_info['gray'], template_info.get('stats'),
+                                ('full', region), frame_id)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+
+        if max_val >= threshold:
+            return [{
+                'found': True,
+                'confidence': max_val,
+                'location': (max_loc[0] + x0, max_loc[1] + y0),
+                'template': template_info['name'],
+                'width': template_info['width'],
+                'height': template_info['height']
+            }]
+    except Exception as e:
+        print(f"Error matching template {template_info['name']}: {e}")
+
+    return []
+
+
+def match_template_peaks(frame_gray, template_info, threshold, region=None, frame_id=None):
+    # Every sun found by one template
+    try:
+        patch, x0, y0 = crop_region(frame_gray, template_info, region)
+        if patch is None:
+            return []
+        result = match_response(patch, template_info['gray'], template_info.get('stats'),
+                                ('full', region), frame_id)
+        matches = find_peaks(result, threshold, template_info['width'], template_info['height'],
+                             template_info['name'])
+        for match in matches:
+            match['location'] = (match['location'][0] + x0, match['location'][1] + y0)
+        return matches
+    except Exception as e:
+        print(f"Error matching template {template_info['name']}: {e}")
+
+    return []
+
+
+def coarse_candidates(coarse_gray, variant, regions, frame_shape, threshold, max_candidates,
+                      frame_id=None):
+    # Full-resolution neighbourhoods of the peaks found at the coarse level
+    coarse_h, coarse_w = variant['coarse'].shape[:2]
+    pad = 4  # Full-res pixels lost to pyrDown rounding
+    frame_h, frame_w = frame_shape[:2]
+
+    boxes = []
+    for region in regions:
+        if region is None:
+            cx0, cy0 = 0, 0
+            patch = coarse_gray
+        else:
+            x, y, w, h = region
+            cx0, cy0 = x // 2, y // 2
+            patch = coarse_gray[cy0:(y + h) // 2, cx0:(x + w) // 2]
+
+        if patch.shape[0] < coarse_h or patch.shape[1] < coarse_w:
+            # Region too small to gain anything from the coarse pass
+            if region is not None:
+                boxes.append(region)
+            continue
+
+        result = match_response(patch, variant['coarse'], variant.get('coarse_stats'),
+                                ('coarse', region), frame_id)
+        peaks = find_peaks(result, threshold, coarse_w, coarse_h)
+        peaks.sort(key=lambda p: p['confidence'], reverse=True)
+
+        for peak in peaks[:max_candidates]:
+            x0 = max(0, (cx0 + peak['location'][0]) * 2 - pad)
+            y0 = max(0, (cy0 + peak['location'][1]) * 2 - pad)
+            x1 = min(frame_w, x0 + variant['width'] + 2 * pad)
+            y1 = min(frame_h, y0 + variant['height'] + 2 * pad)
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+
+    return merge_boxes(boxes)
+
+
+def dirty_response_boxes(dirty, tile_size, template_size, frame_shape):
+    # Response map rectangles (x0, y0, x1, y1) whose windows touch a dirty tile
+    w, h = template_size
+    frame_h, frame_w = frame_shape[:2]
+    response_w, response_h = frame_w - w + 1, frame_h - h + 1
+    count, _, stats, _ = cv2.connectedComponentsWithStats(dirty.astype(np.uint8), connectivity=8)
+    boxes = []
+    for tx, ty, tw, th, _ in stats[1:count]:
+        px0, py0 = tx * tile_size, ty * tile_size
+        px1, py1 = min(frame_w, (tx + tw) * tile_size), min(frame_h, (ty + th) * tile_size)
+        x0, y0 = max(0, px0 - w + 1), max(0, py0 - h + 1)
+        x1, y1 = min(response_w, px1), min(response_h, py1)
+        if x1 > x0 and y1 > y0:
+            boxes.append((x0, y0, x1, y1))
+    return boxes
+
+
+def update_peaks(response, peaks, boxes, threshold, width, height, template_name):
+    # Merge cached peaks with peaks re-extracted around the updated boxes.
+    # A peak depends on its dilation neighbourhood, so each box is grown by
+    # the neighbourhood radius (affected peaks) and again for context.
+    radius_y, radius_x = max(1, height // 2) // 2 + 1, max(1, width // 2) // 2 + 1
+    resp_h, resp_w = response.shape[:2]
+    affected = [(max(0, x0 - radius_x), max(0, y0 - radius_y),
+                 min(resp_w, x1 + radius_x), min(resp_h, y1 + radius_y)) for x0, y0, x1, y1 in boxes]
+
+    def inside(location):
+        x, y = location
+        return any(ax0 <= x < ax1 and ay0 <= y < ay1 for ax0, ay0, ax1, ay1 in affected)
+
+    merged = [peak for peak in peaks if not inside(peak['location'])]
+    seen = set()
+    for ax0, ay0, ax1, ay1 in affected:
+        cx0, cy0 = max(0, ax0 - radius_x), max(0, ay0 - radius_y)
+        cx1, cy1 = min(resp_w, ax1 + radius_x), min(resp_h, ay1 + radius_y)
+        for peak in find_peaks(response[cy0:cy1, cx0:cx1], threshold, width, height, template_name):
+            location = (peak['location'][0] + cx0, peak['location'][1] + cy0)
+            if ax0 <= location[0] < ax1 and ay0 <= location[1] < ay1 and location not in seen:
+                seen.add(location)
+                peak['location'] = location
+                merged.append(peak)
+    return merged
+
+
+def match_template_incremental(frame_gray, variant, params):
+    # Whole-frame matches of one template variant from a response map cached
+    # across frames: only windows overlapping tiles that changed since the
+    # map was last brought up to date are matched again
+    h, w = variant['height'], variant['width']
+    if frame_gray.shape[0] < h or frame_gray.shape[1] < w:
+        return []
+    try:
+        key = (variant['name'], variant['scale'], frame_gray.shape)
+        entry = _response_cache.get(key)
+        if entry is None or entry['template'] is not variant['gray']:
+            if len(_response_cache) > 64:
+                _response_cache.clear()
+            entry = _response_cache[key] = {
+                'template': variant['gray'],
+                'response': np.empty((frame_gray.shape[0] - h + 1, frame_gray.shape[1] - w + 1),
+                                     dtype=np.float32),
+                'frame_id': None,
+                'matches': None,
+                'settings': None
+            }
+
+        response = entry['response']
+        if entry['frame_id'] is None:
+            boxes = [(0, 0, response.shape[1], response.shape[0])]
+        else:
+            dirty = params['tile_changes'] > entry['frame_id']
+            boxes = []
+            if dirty.any():
+                boxes = dirty_response_boxes(dirty, params['tile_size'], (w, h), frame_gray.shape)
+
+        for x0, y0, x1, y1 in boxes:
+            patch = frame_gray[y0:y1 + h - 1, x0:x1 + w - 1]
+            response[y0:y1, x0:x1] = cv2.matchTemplate(
+                patch, variant['gray'], cv2.TM_CCOEFF_NORMED,
+                result=response_buffer(patch, variant['gray']))
+        entry['frame_id'] = params['frame_id']
+
+        # Peaks only change with the map (or the settings)
+        settings = (params['threshold'], params['multi_detect'])
+        if entry['settings'] != settings:
+            boxes = [(0, 0, response.shape[1], response.shape[0])]
+        if boxes:
+            entry['settings'] = settings
+            if params['multi_detect']:
+                entry['matches'] = update_peaks(response, entry['matches'] or [], boxes,
+                                                params['threshold'], w, h, variant['name'])
+            else:
+                _, max_val, _, max_loc = cv2.minMaxLoc(response)
+                entry['matches'] = [{
+                    'found': True,
+                    'confidence': max_val,
+                    'location': max_loc,
+                    'template': variant['name'],
+                    'width': w,
+                    'height': h
+                }] if max_val >= params['threshold'] else []
+
+        # Callers annotate matches (click point, track id): hand out copies
+        return [dict(match) for match in entry['matches']]
+    except Exception as e:
+        _response_cache.pop((variant['name'], variant['scale'], frame_gray.shape), None)
+        print(f"Error matching template {variant['name']}: {e}")
+    return []
+
+
+def match_template_regions(frame_gray, template_info, regions, coarse_gray, params):
+    # All matches of one template (every scale variant) over a list of
+    # regions (None = whole frame). With a coarse frame, each variant is
+    # first matched at half resolution and only refined around candidates.
+    # With tile changes and the whole frame, cached response maps are
+    # updated incrementally instead.
+    threshold = params['threshold']
+    frame_id = params.get('frame_id') if params.get('template_stats') else None
+    incremental = params.get('tile_changes') is not None and regions == [None]
+    worker = match_template_peaks if params['multi_detect'] else match_template_best
+    matches = []
+    for variant in template_info.get('variants', [template_info]):
+        if incremental:
+            matches.extend(match_template_incremental(frame_gray, variant, params))
+            continue
+
+        variant_regions = regions
+        if coarse_gray is not None and variant['coarse'] is not None:
+            variant_regions = coarse_candidates(coarse_gray, variant, regions, frame_gray.shape,
+                                                threshold - params['coarse_margin'],
+                                                params['max_coarse_candidates'], frame_id)
+
+        for region in variant_regions:
+            matches.extend(worker(frame_gray, variant, threshold, region, frame_id))
+    return matches
@@ -0,0 +1,215 @@
+import glob
+import json
+import os
+import time
+
+import cv2
+import mss
+import numpy as np
+
+
+class ScreenCapture:
+    # Live capture source backed by mss. Capture sources look like an mss
+    # instance (monitors, grab) plus advance(), which moves to the next frame.
+
+    def __enter__(self):
+        self.sct = mss.mss()
+        self.sct.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.sct.__exit__(*exc)
+
+    @property
+    def monitors(self):
+        return self.sct.monitors
+
+    def advance(self):
+        # The screen always has a new frame
+        return True
+
+    def grab(self, region):
+        # OPTIMIZATION: Wrap mss's raw BGRA buffer instead of copying it
+        sct_img = self.sct.grab(region)
+        return np.frombuffer(sct_img.raw, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
+
+
+class RecordedSource:
+    # Base for sources that replay recorded frames as if they were a single
+    # monitor, so the detection path can run headlessly. Subclasses
+    # implement _load(index) -> (BGRA frame, frame name), or None past the end.
+
+    def __init__(self, path):
+        self.path = path
+        self.index = -1
+        self.frame = None
+        self.frame_name = None
+        self.monitors = []
+
+    def peek(self):
+        # Read the first frame to know the "monitor" size; advance() reuses it
+        if not self._set_frame(0):
+            raise ValueError(f"No readable frames in {self.path}")
+        self.index = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def _load(self, index):
+        raise NotImplementedError
+
+    def _set_frame(self, index):
+        loaded = self._load(index)
+        if loaded is None:
+            return False
+        self.frame, self.frame_name = loaded
+        h, w = self.frame.shape[:2]
+        monitor = {'left': 0, 'top': 0, 'width': w, 'height': h}
+        # Index 0 is "all monitors" in mss; keep the same layout
+        self.monitors = [monitor, monitor]
+        return True
+
+    def advance(self):
+        if self.index == -1 and self.frame is not None:
+            # First frame was already read while peeking
+            self.index = 0
+            return True
+        self.index += 1
+        return self._set_frame(self.index)
+
+    def grab(self, region):
+        x = region['left']
+        y = region['top']
+        return self.frame[y:y + region['height'], x:x + region['width']]
+
+
+class ReplaySource(RecordedSource):
+    # Replays a directory of PNGs or a video file
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.video = None
+        self.files = []
+        if os.path.isdir(path):
+            self.files = sorted(glob.glob(os.path.join(path, '*.png')))
+            if not self.files:
+                raise ValueError(f"No PNG frames found in {path}")
+        else:
+            self.video = cv2.VideoCapture(path)
+            if not self.video.isOpened():
+                raise ValueError(f"Could not open video {path}")
+        self.peek()
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+
+    def _load(self, index):
+        if self.video is not None:
+            ok, frame_bgr = self.video.read()
+            if not ok:
+                return None
+            name = str(index)
+        else:
+            if index >= len(self.files):
+                return None
+            frame_bgr = cv2.imread(self.files[index], cv2.IMREAD_COLOR)
+            if frame_bgr is None:
+                return None
+            name = os.path.basename(self.files[index])
+        return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2BGRA), name
+
+
+class RecordingSource(RecordedSource):
+    # Replays a session recording (see session_recorder) frame by frame, in
+    # recorded order. 'crop' recordings give back the captured pixels;
+    # 'gray' ones are scaled back up to the capture size so the bot's own
+    # conversion and downscale run as usual.
+
+    def __init__(self, path):
+        super().__init__(path)
+        with open(os.path.join(path, 'session.json')) as f:
+            self.session = json.load(f)
+        self.mode = self.session.get('mode', 'gray')
+
+        self.entries = []
+        with open(os.path.join(path, 'frames.jsonl')) as f:
+            for line in f:
+                try:
+                    self.entries.append(json.loads(line))
+                except ValueError:
+                    break  # Cut short by a crash; keep what was complete
+        if not self.entries:
+            raise ValueError(f"No recorded frames in {path}")
+
+        self.chunk_name = None
+        self.chunk = None
+        self.frame_time = None  # Recorded capture time of the current frame
+        self.peek()
+
+    def close(self):
+        self.chunk = None
+
+    def _load(self, index):
+        if index >= len(self.entries):
+            return None
+        entry = self.entries[index]
+        if entry['chunk'] != self.chunk_name:
+            with np.load(os.path.join(self.path, entry['chunk'])) as data:
+                self.chunk = data['frames']
+            self.chunk_name = entry['chunk']
+        image = self.chunk[entry['offset']]
+
+        w, h = entry['region'][2], entry['region'][3]
+        if self.mode == 'gray':
+            if image.shape[:2] != (h, w):
+                image = cv2.resize(image, (w, h), interpolation=cv2.INTER_LINEAR)
+            frame = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+        else:
+            frame = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        self.frame_time = entry['t']
+        return frame, f"{entry['index']:06d}"
+
+    def detections(self):
+        # The recorded click targets as replay ground truth: frame name ->
+        # sun centers in frame pixels (screen position minus capture offset)
+        truth = {}
+        for entry in self.entries:
+            left, top = entry['region'][:2]
+            truth[f"{entry['index']:06d}"] = [[m['click'][0] - left, m['click'][1] - top]
+                                              for m in entry['matches']]
+        return truth
+
+
+def open_source(path):
+    # Session recording, PNG folder or video file
+    if os.path.isfile(os.path.join(path, 'session.json')):
+        return RecordingSource(path)
+    return ReplaySource(path)
+
+
+class PyAutoGuiClickSink:
+    # Real mouse clicks. pyautogui is imported lazily because it needs a display.
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def click(self, x, y):
+        self.pyautogui.click(x, y)
+
+
+class RecordingClickSink:
+    # Records clicks instead of performing them (replay, tests, dry runs)
+
+    def __init__(self):
+        self.clicks = []
+
+    def click(self, x, y):
+        self.clicks.append((x, y, time.time()))
@@ -0,0 +1,78 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class FrameQueue:
+    # Bounded hand-off queue between pipeline stages. When full, the oldest
+    # item is dropped so the consumer always works on the freshest frame.
+
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            while len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        # Returns None on timeout so stages can check whether to keep running
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def clear(self):
+        with self.cond:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class FrameBufferRing:
+    # Preallocated per-frame working buffers (gray, downscaled gray, coarse
+    # level), handed out round-robin so OpenCV can write into dst= arrays
+    # instead of allocating. Reallocated only when the capture size or
+    # downscale factor changes (monitor or ROI switch).
+
+    def __init__(self, size=4):
+        self.size = size  # More slots than frames in flight between stages
+        self.slots = []
+        self.index = 0
+        self.key = None
+
+    def scaled_size(self, shape, factor):
+        # (width, height) matching cv2.resize(..., fx=factor, fy=factor)
+        return (max(1, int(round(shape[1] * factor))), max(1, int(round(shape[0] * factor))))
+
+    def allocate(self, shape, factor):
+        h, w = shape[:2]
+        small_w, small_h = self.scaled_size(shape, factor)
+        self.slots = []
+        for _ in range(self.size):
+            gray_full = np.empty((h, w), dtype=np.uint8)
+            gray = gray_full if factor == 1.0 else np.empty((small_h, small_w), dtype=np.uint8)
+            self.slots.append({
+                'gray_full': gray_full,
+                'gray': gray,
+                'coarse': np.empty(((small_h + 1) // 2, (small_w + 1) // 2), dtype=np.uint8)
+            })
+        self.index = 0
+        self.key = (h, w, factor)
+
+    def next(self, shape, factor):
+        if self.key != (shape[0], shape[1], factor):
+            self.allocate(shape, factor)
+        slot = self.slots[self.index]
+        self.index = (self.index + 1) % self.size
+        return slot
@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from sun_clicker_bot import SunClickerBot
+from sun_io import RecordingClickSink, RecordingSource, open_source
+from telemetry import Telemetry
+
+
+# Offline benchmark: replays recorded frames (PNG folder, video or session
+# recording) through the bot's detection path and reports per-stage latency
+# percentiles, frames/s and, given a ground truth file, detection
+# precision/recall. With --baseline, a session recording's own detections
+# are the ground truth, which turns any recording into a regression test.
+#
+# Ground truth is JSON mapping frame names (PNG file names, or frame index
+# for videos) to lists of sun centers in frame pixels:
+#     {"frame_0001.png": [[412, 230], [610, 118]], "frame_0002.png": []}
+
+
+def match_points(detected, expected, radius):
+    # Greedy one-to-one matching; returns (true positives, false positives, false negatives)
+    if not detected or not expected:
+        return 0, len(detected), len(expected)
+
+    detected = np.asarray(detected, dtype=np.float64)
+    expected = np.asarray(expected, dtype=np.float64)
+    distances = np.linalg.norm(detected[:, None, :] - expected[None, :, :], axis=2)
+
+    used_detected = set()
+    used_expected = set()
+    for flat in np.argsort(distances, axis=None):
+        d, e = np.unravel_index(flat, distances.shape)
+        if distances[d, e] > radius:
+            break
+        if d in used_detected or e in used_expected:
+            continue
+        used_detected.add(d)
+        used_expected.add(e)
+
+    tp = len(used_detected)
+    return tp, len(detected) - tp, len(expected) - tp
+
+
+def run_replay(bot, source, truth=None, match_radius=None, frame_skip=1):
+    # Drives capture -> detect -> click on this thread, one recorded frame at a time
+    if bot.click_dispatcher.sink is None:
+        bot.click_dispatcher.sink = RecordingClickSink()
+    if isinstance(bot.click_dispatcher.sink, RecordingClickSink):
+        # No real mouse: don't pace clicks, or frames/s would depend on how
+        # many suns were clicked rather than on detection speed
+        bot.click_dispatcher.min_interval = 0
+    if match_radius is None:
+        match_radius = max(bot.template_padding) / bot.downscale_factor / 2
+    # Recordings replay on their own clock; drop state timed against another
+    bot.tracker.reset()
+    bot.motion_gate.reset()
+
+    timings = Telemetry()
+    tp = fp = fn = 0
+    frames = 0
+    evaluated = 0
+    index = 0
+
+    start = time.time()
+    while True:
+        frame_start = time.perf_counter()
+        packet = bot.capture_frame(source)
+        if packet is None:
+            break
+        index += 1
+        # Decimate the recording like a slower capture rate would
+        if (index - 1) % frame_skip != 0:
+            continue
+
+        captured = time.perf_counter()
+        bot.process_frame(packet)
+        detected = time.perf_counter()
+        bot.queue_clicks(packet)
+        bot.click_dispatcher.flush()
+        clicked = time.perf_counter()
+
+        timings.record('capture', captured - frame_start)
+        timings.record('detect', detected - captured)
+        timings.record('click', clicked - detected)
+        timings.record('total', clicked - frame_start)
+        frames += 1
+
+        if truth is not None and source.frame_name in truth:
+            points = [m['click'] for m in packet['matches']]
+            t, f, n = match_points(points, truth[source.frame_name], match_radius)
+            tp += t
+            fp += f
+            fn += n
+            evaluated += 1
+
+    elapsed = time.time() - start
+    report = {
+        'source': source.path,
+        'frames': frames,
+        'elapsed_s': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+        'clicks': bot.clicks_counter,
+        'detection_to_click': bot.click_dispatcher.latency_summary(),
+        'stages': {name: stats.histogram.summary() for name, stats in timings.stages.items()},
+        # Inside detection: convert, match and match:<template>
+        'bot_stages': {name: stats.histogram.summary()
+                       for name, stats in sorted(bot.telemetry.stages.items())},
+        'settings': {
+            'downscale_factor': bot.downscale_factor,
+            'frame_skip': frame_skip,
+            'confidence_threshold': bot.confidence_threshold,
+            'use_parallel': bot.use_parallel,
+            'workers': bot.max_workers if bot.use_parallel else 0,
+            'backend': bot.matching_backend.name if bot.use_parallel else 'serial',
+            'multi_detect': bot.multi_detect,
+            'use_multiscale': bot.use_multiscale,
+            'use_motion_gate': bot.use_motion_gate,
+            'use_color_prefilter': bot.use_color_prefilter,
+            'use_incremental': bot.use_incremental,
+            'use_template_stats': bot.use_template_stats,
+            'use_tracker': bot.use_tracker
+        }
+    }
+    if truth is not None:
+        report['accuracy'] = {
+            'frames_evaluated': evaluated,
+            'match_radius': match_radius,
+            'true_positives': tp,
+            'false_positives': fp,
+            'false_negatives': fn,
+            'precision': tp / (tp + fp) if tp + fp else 1.0,
+            'recall': tp / (tp + fn) if tp + fn else 1.0
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\n=== Replay: {report['source']} ===")
+    print(f"  Frames: {report['frames']} in {report['elapsed_s']:.2f}s ({report['fps']:.1f} frames/s)")
+    # Per-frame stages, then the detection breakdown (convert, match, match:<template>)
+    breakdown = {name: stats for name, stats in report['bot_stages'].items()
+                 if name not in report['stages']}
+    for name, stats in list(report['stages'].items()) + list(breakdown.items()):
+        if stats['count']:
+            print(f"  {name:>8}: p50 {stats['p50_ms']:.2f} ms | p90 {stats['p90_ms']:.2f} ms | "
+                  f"p99 {stats['p99_ms']:.2f} ms | max {stats['max_ms']:.2f} ms")
+    if 'accuracy' in report:
+        acc = report['accuracy']
+        print(f"  Precision: {acc['precision']:.3f} | Recall: {acc['recall']:.3f} "
+              f"(TP {acc['true_positives']}, FP {acc['false_positives']}, FN {acc['false_negatives']})")
+
+
+def run_bench(bot, frames, truth_path=None, baseline=False, record=None, report_path=None,
+              frame_skip=1):
+    # Replay, print and optionally save the report; shared with
+    # sun_clicker_cli --bench. Shuts the bot's backend, recorder and
+    # telemetry down afterwards. Returns the exit code.
+    truth = None
+    if truth_path:
+        with open(truth_path) as f:
+            truth = json.load(f)
+
+    source = open_source(frames)
+    try:
+        if baseline:
+            if not isinstance(source, RecordingSource):
+                print("--baseline needs a session recording")
+                return 1
+            truth = source.detections()
+        if record:
+            bot.start_recording(record)
+        report = run_replay(bot, source, truth=truth, frame_skip=max(1, frame_skip))
+    finally:
+        source.close()
+        bot.matching_backend.close()
+        bot.stop_recording()
+        bot.telemetry.close()
+
+    print_report(report)
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {os.path.abspath(report_path)}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Replay recorded frames through the sun detector")
+    parser.add_argument('frames', help="Directory of PNG frames, a video file or a session recording")
+    parser.add_argument('--truth', help="Ground truth JSON (frame name -> list of [x, y])")
+    parser.add_argument('--baseline', action='store_true',
+                        help="Use a session recording's own detections as the ground truth")
+    parser.add_argument('--record', metavar='DIR', help="Record this replay as a new session")
+    parser.add_argument('--record-mode', choices=['gray', 'crop'], default='gray',
+                        help="Recorded frames: downscaled gray (compact) or full captures")
+    parser.add_argument('--report', help="Write the JSON report here")
+    parser.add_argument('--downscale', type=float, help="downscale_factor")
+    parser.add_argument('--confidence', type=float, help="confidence_threshold")
+    parser.add_argument('--frame-skip', type=int, default=1, help="Process every Nth recorded frame")
+    parser.add_argument('--workers', type=int, help="Template matching threads (0 = sequential)")
+    parser.add_argument('--backend', choices=['auto', 'serial', 'thread', 'tiled', 'process'],
+                        help="Template matching backend")
+    parser.add_argument('--multiscale', action='store_true', help="Coarse-to-fine multi-scale matching")
+    parser.add_argument('--motion-gate', action='store_true', help="Enable motion gating")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Re-match only changed tiles against cached response maps")
+    parser.add_argument('--color-prefilter', action='store_true', help="Enable the color prefilter")
+    parser.add_argument('--template-stats', action='store_true',
+                        help="Match with the template bank's precomputed statistics")
+    parser.add_argument('--trace', help="Write per-stage timings to this CSV/JSONL file")
+    parser.add_argument('--no-auto-roi', action='store_true', help="Match the whole frame")
+    parser.add_argument('--no-tracker', action='store_true', help="Disable sun tracking")
+    return parser
+
+
+def configure_bot(bot, args):
+    # Command line flags as a config profile (see SunClickerBot.apply_config)
+    detection = {
+        'multiscale': args.multiscale,
+        'template_stats': args.template_stats
+    }
+    if args.downscale is not None:
+        detection['downscale_factor'] = args.downscale
+    if args.confidence is not None:
+        detection['confidence_threshold'] = args.confidence
+    matching = {}
+    if args.workers is not None:
+        matching['workers'] = args.workers
+    if args.backend is not None:
+        matching['backend'] = args.backend
+    bot.apply_config({
+        'detection': detection,
+        'capture': {'auto_roi': not args.no_auto_roi},
+        'filters': {
+            'motion_gate': args.motion_gate,
+            'color_prefilter': args.color_prefilter,
+            'incremental': args.incremental,
+            'tracker': not args.no_tracker
+        },
+        'matching': matching
+    })
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    bot = SunClickerBot()
+    configure_bot(bot, args)
+    if args.trace:
+        bot.telemetry.open_trace(args.trace)
+    bot.record_mode = args.record_mode
+    return run_bench(bot, args.frames, truth_path=args.truth, baseline=args.baseline,
+                     record=args.record, report_path=args.report, frame_skip=args.frame_skip)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import threading
+
+import numpy as np
+
+
+class SunTracker:
+    # Lightweight multi-object tracker for falling suns. Each sun gets an ID
+    # and a constant-velocity (alpha-beta filtered) state in screen pixels, so
+    # clicks can aim where the sun will be and re-clicks are suppressed per ID.
+
+    def __init__(self, gate_distance=60, max_age=0.5, alpha=0.85, beta=0.3):
+        self.gate_distance = gate_distance  # Max px between prediction and detection
+        self.max_age = max_age  # Forget tracks not seen for this long (s)
+        self.alpha = alpha  # Position gain
+        self.beta = beta  # Velocity gain
+        self.reclick_interval = 1.0  # Retry a clicked sun that is still there (s)
+        self.max_speed = 600.0  # Clamp velocity (px/s) against bad associations
+
+        self.click_latency = 0.05  # EMA of capture-to-click delay (s)
+        self.latency_smoothing = 0.2
+
+        self.tracks = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.tracks.clear()
+
+    def update(self, matches, timestamp):
+        # Link this frame's detections to tracks; sets match['track_id']
+        with self.lock:
+            ids = list(self.tracks)
+            unmatched = list(range(len(matches)))
+
+            if ids and matches:
+                predicted = np.array([self._predict(self.tracks[i], timestamp) for i in ids])
+                points = np.array([m['click'] for m in matches], dtype=np.float64)
+                distances = np.linalg.norm(predicted[:, None, :] - points[None, :, :], axis=2)
+
+                # Greedy assignment, closest pairs first
+                used_tracks = set()
+                used_matches = set()
+                for flat in np.argsort(distances, axis=None):
+                    t, m = np.unravel_index(flat, distances.shape)
+                    if distances[t, m] > self.gate_distance:
+                        break
+                    if t in used_tracks or m in used_matches:
+                        continue
+                    used_tracks.add(t)
+                    used_matches.add(m)
+                    self._correct(self.tracks[ids[t]], predicted[t], points[m], timestamp)
+                    matches[m]['track_id'] = ids[t]
+
+                unmatched = [m for m in unmatched if m not in used_matches]
+
+            for m in unmatched:
+                track_id = self.next_id
+                self.next_id += 1
+                x, y = matches[m]['click']
+                self.tracks[track_id] = {
+                    'position': np.array([x, y], dtype=np.float64),
+                    'velocity': np.zeros(2),
+                    'last_seen': timestamp,
+                    'hits': 1,
+                    'clicked_at': None
+                }
+                matches[m]['track_id'] = track_id
+
+            # Expire tracks we have not seen for a while
+            for track_id in ids:
+                if timestamp - self.tracks[track_id]['last_seen'] > self.max_age:
+                    del self.tracks[track_id]
+
+    def _predict(self, track, at_time):
+        return track['position'] + track['velocity'] * (at_time - track['last_seen'])
+
+    def _correct(self, track, predicted, measured, timestamp):
+        dt = timestamp - track['last_seen']
+        residual = measured - predicted
+        track['position'] = predicted + self.alpha * residual
+        if dt > 0:
+            velocity = track['velocity'] + self.beta * residual / dt
+            speed = np.linalg.norm(velocity)
+            if speed > self.max_speed:
+                velocity *= self.max_speed / speed
+            track['velocity'] = velocity
+        track['last_seen'] = timestamp
+        track['hits'] += 1
+
+    def predict_click(self, track_id):
+        # Where the sun will be once a click issued now lands
+        with self.lock:
+            track = self.tracks.get(track_id)
+            if track is None:
+                return None
+            x, y = self._predict(track, track['last_seen'] + self.click_latency)
+            return int(round(x)), int(round(y))
+
+    def should_click(self, track_id, now):
+        with self.lock:
+            track = self.tracks.get(track_id)
+            if track is None:
+                return False
+            return track['clicked_at'] is None or now - track['clicked_at'] >= self.reclick_interval
+
+    def mark_clicked(self, track_id, now, capture_time):
+        with self.lock:
+            track = self.tracks.get(track_id)
+            if track is not None:
+                track['clicked_at'] = now
+            latency = now - capture_time
+            self.click_latency += (latency - self.click_latency) * self.latency_smoothing
@@ -0,0 +1,268 @@
+import csv
+import json
+import math
+import threading
+import time
+from collections import deque
+
+
+# Low-overhead performance instrumentation. Every stage (capture, convert,
+# match, match:<template>, click, render) records durations measured with
+# the monotonic perf_counter clock into a streaming histogram, so any
+# percentile is available at any time without keeping the samples. The
+# numbers can be read by the GUI, written to a CSV/JSONL trace and served
+# on a local HTTP /metrics endpoint.
+
+
+class StreamingHistogram:
+    # Log-spaced buckets from min_ms to max_ms, each growth times wider than
+    # the previous one: percentiles are within growth/2 of the true value,
+    # recording is O(1) and memory is fixed.
+
+    def __init__(self, min_ms=0.01, max_ms=10000.0, growth=1.1):
+        self.min_ms = min_ms
+        self.growth = growth
+        self.log_growth = math.log(growth)
+        self.buckets = [0] * (int(math.log(max_ms / min_ms) / self.log_growth) + 2)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        if ms <= self.min_ms:
+            index = 0
+        else:
+            index = min(len(self.buckets) - 1, int(math.log(ms / self.min_ms) / self.log_growth) + 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q):
+        # Geometric middle of the bucket holding the q-th percentile
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                if index == 0:
+                    return self.min_ms
+                upper = self.min_ms * self.growth ** index
+                return min(self.max_ms, upper / math.sqrt(self.growth))
+        return self.max_ms
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms
+        }
+
+
+class StageStats:
+    # Throughput, recent busy time and duration histogram of one stage
+
+    def __init__(self, name, window=2.0):
+        self.name = name
+        self.window = window
+        self.completed = deque()  # Completion timestamps inside the window
+        self.durations = deque(maxlen=60)
+        self.histogram = StreamingHistogram()
+        self.total = 0
+        self.queue = None  # Input queue, for the dropped-frame count
+        self.skipped = 0  # Items the stage itself discarded as stale
+        self.lock = threading.Lock()
+
+    def record(self, duration, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.completed.append(now)
+            self.durations.append(duration)
+            self.histogram.add(duration * 1000.0)
+            self.total += 1
+            while self.completed and now - self.completed[0] > self.window:
+                self.completed.popleft()
+
+    @property
+    def rate(self):
+        # Items per second over the window
+        if len(self.completed) < 2:
+            return 0.0
+        span = self.completed[-1] - self.completed[0]
+        return (len(self.completed) - 1) / span if span > 0 else 0.0
+
+    @property
+    def avg_ms(self):
+        if not self.durations:
+            return 0.0
+        return 1000.0 * sum(self.durations) / len(self.durations)
+
+    @property
+    def dropped(self):
+        queued = self.queue.dropped if self.queue is not None else 0
+        return queued + self.skipped
+
+    def snapshot(self):
+        with self.lock:
+            result = self.histogram.summary()
+        result.update({'rate': self.rate, 'recent_ms': self.avg_ms, 'dropped': self.dropped})
+        return result
+
+    def summary(self):
+        text = f"{self.name}: {self.rate:.1f}/s, {self.avg_ms:.1f} ms, {self.dropped} dropped"
+        if self.histogram.count:
+            text += (f" (p50 {self.histogram.percentile(50):.1f} ms,"
+                     f" p99 {self.histogram.percentile(99):.1f} ms)")
+        return text
+
+
+class Telemetry:
+    # Registry of stage statistics plus the optional trace file and HTTP endpoint
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.trace_file = None
+        self.trace_writer = None
+        self.trace_format = None
+        self.trace_start = 0.0
+        self.server = None
+
+    def stage(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            with self.lock:
+                stats = self.stages.setdefault(name, StageStats(name))
+        return stats
+
+    def record(self, name, duration, now=None):
+        self.stage(name).record(duration, now)
+        if self.trace_file is not None:
+            self.write_trace(name, duration)
+
+    def timer(self, name):
+        return StageTimer(self, name)
+
+    def snapshot(self):
+        return {name: stats.snapshot() for name, stats in list(self.stages.items())}
+
+    # --- Trace file ---
+
+    def open_trace(self, path):
+        # .csv gets CSV rows, anything else JSON lines: time since start (s), stage, ms
+        self.close_trace()
+        self.trace_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+        self.trace_file = open(path, 'w', newline='', buffering=65536)
+        self.trace_start = time.perf_counter()
+        if self.trace_format == 'csv':
+            self.trace_writer = csv.writer(self.trace_file)
+            self.trace_writer.writerow(['t', 'stage', 'ms'])
+        print(f"Writing telemetry trace to {path}")
+
+    def write_trace(self, name, duration):
+        t = round(time.perf_counter() - self.trace_start, 6)
+        ms = round(duration * 1000.0, 3)
+        with self.lock:
+            if self.trace_file is None:
+                return
+            if self.trace_writer is not None:
+                self.trace_writer.writerow([t, name, ms])
+            else:
+                self.trace_file.write(json.dumps({'t': t, 'stage': name, 'ms': ms}) + '\n')
+
+    def close_trace(self):
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.close()
+            self.trace_file = None
+            self.trace_writer = None
+
+    # --- HTTP endpoint ---
+
+    def start_server(self, port, host='127.0.0.1'):
+        # /metrics in Prometheus text format, /metrics.json as JSON
+        if self.server is not None:
+            return
+        # Imported here: http.server is slow to import and rarely needed
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = telemetry.prometheus_text().encode()
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(telemetry.snapshot(), indent=1).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep the console for the bot's own output
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{host}:{self.server.server_address[1]}/metrics")
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def prometheus_text(self):
+        lines = [
+            '# HELP sun_clicker_stage_ms Stage duration in milliseconds',
+            '# TYPE sun_clicker_stage_ms summary'
+        ]
+        rates = ['# HELP sun_clicker_stage_rate Completions per second',
+                 '# TYPE sun_clicker_stage_rate gauge']
+        for name, stats in sorted(self.snapshot().items()):
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            if stats['count']:
+                for q in (50, 90, 99):
+                    lines.append(f'sun_clicker_stage_ms{{stage="{label}",quantile="0.{q}"}} '
+                                 f'{stats[f"p{q}_ms"]:.4f}')
+                lines.append(f'sun_clicker_stage_ms_sum{{stage="{label}"}} '
+                             f'{stats["mean_ms"] * stats["count"]:.4f}')
+            lines.append(f'sun_clicker_stage_ms_count{{stage="{label}"}} {stats["count"]}')
+            rates.append(f'sun_clicker_stage_rate{{stage="{label}"}} {stats["rate"]:.3f}')
+        return '\n'.join(lines + rates) + '\n'
+
+    def close(self):
+        self.close_trace()
+        self.stop_server()
+
+
+class StageTimer:
+    # with telemetry.timer('render'): ... records the block's duration
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+        self.duration = 0.0  # Seconds, once the block has run
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        self.telemetry.record(self.name, self.duration)
+        return False
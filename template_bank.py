@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+
+# Compiled template bank. Preprocessed template variants (downscaled gray,
+# half-size coarse copy and their mean / norm statistics) are
+# written once to .npy files next to a JSON manifest, keyed by the hash of
+# the source PNG and the resize factor. Later startups skip decoding and
+# resizing and memory-map the arrays instead.
+
+BANK_VERSION = 1
+
+
+def default_cache_dir():
+    # Per-user cache folder (%LOCALAPPDATA% on Windows, ~/.cache elsewhere)
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pvz_sun_clicker', 'templates')
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def template_stats(gray):
+    # Mean and L2 norm of the zero-mean template: everything
+    # TM_CCOEFF_NORMED needs from the template side
+    values = gray.astype(np.float64)
+    mean = float(values.mean())
+    values -= mean
+    return mean, float(np.sqrt(np.dot(values.ravel(), values.ravel())))
+
+
+def compile_variant(template_gray, factor, coarse_min_size):
+    # Arrays and statistics for one template at one resize factor
+    if factor != 1.0:
+        gray = cv2.resize(template_gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    else:
+        gray = template_gray
+    h, w = gray.shape[:2]
+    arrays = {'gray': gray}
+    meta = {'width': w, 'height': h}
+    meta['mean'], meta['norm'] = template_stats(gray)
+    if min(h, w) // 2 >= coarse_min_size:
+        arrays['coarse'] = cv2.pyrDown(gray)
+        meta['coarse_mean'], meta['coarse_norm'] = template_stats(arrays['coarse'])
+    return arrays, meta
+
+
+class TemplateBank:
+    # Loads template variants from the on-disk cache, compiling (and
+    # caching) whatever is missing. cache_dir=None keeps everything in memory.
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.manifest = None
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.cache_dir, 'manifest.json')
+
+    def load_manifest(self):
+        if self.manifest is not None:
+            return self.manifest
+        self.manifest = {'version': BANK_VERSION, 'entries': {}}
+        if self.cache_dir and os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == BANK_VERSION:
+                    self.manifest = manifest
+            except (OSError, ValueError) as e:
+                print(f"Template cache manifest unreadable, rebuilding: {e}")
+        return self.manifest
+
+    def variants(self, filepath, name, downscale_factor, scales, coarse_min_size):
+        # One variant dict per scale, or None if the image can't be read
+        try:
+            source_hash = file_hash(filepath)
+        except OSError:
+            return None
+
+        entries = self.load_manifest()['entries']
+        template_gray = None
+        variants = []
+        for scale in scales:
+            factor = downscale_factor * scale
+            key = f"{source_hash[:16]}_{factor:.4f}_{coarse_min_size}"
+            entry = entries.get(key)
+            arrays = self.load_arrays(entry) if entry is not None else None
+
+            if arrays is None:
+                self.misses += 1
+                if template_gray is None:
+                    template_gray = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+                    if template_gray is None:
+                        return None
+                arrays, meta = compile_variant(template_gray, factor, coarse_min_size)
+                entry = self.store(key, arrays, meta, filepath)
+            else:
+                self.hits += 1
+
+            variants.append(self.make_variant(name, scale, arrays, entry))
+        return variants
+
+    def make_variant(self, name, scale, arrays, entry):
+        coarse_stats = None
+        if 'coarse' in arrays:
+            coarse_stats = (entry['coarse_mean'], entry['coarse_norm'])
+        return {
+            'gray': arrays['gray'],
+            'coarse': arrays.get('coarse'),
+            'name': name,
+            'scale': scale,
+            'width': entry['width'],
+            'height': entry['height'],
+            # Precomputed template side of TM_CCOEFF_NORMED (see match_response)
+            'stats': (entry['mean'], entry['norm']),
+            'coarse_stats': coarse_stats
+        }
+
+    def load_arrays(self, entry):
+        # OPTIMIZATION: Memory-map the cached arrays; pages load on first use
+        try:
+            return {kind: np.load(os.path.join(self.cache_dir, filename), mmap_mode='r')
+                    for kind, filename in entry['files'].items()}
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, arrays, meta, filepath):
+        entry = dict(meta, source=os.path.basename(filepath), files={})
+        if not self.cache_dir:
+            return entry
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for kind, array in arrays.items():
+                filename = f"{key}_{kind}.npy"
+                tmp_path = os.path.join(self.cache_dir, filename + '.tmp')
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp_path, os.path.join(self.cache_dir, filename))
+                entry['files'][kind] = filename
+        except OSError as e:
+            print(f"Could not write template cache: {e}")
+            return entry
+
+        self.manifest['entries'][key] = entry
+        self.dirty = True
+        return entry
+
+    def save(self):
+        # Write the manifest if anything was compiled since the last save
+        if not self.dirty or not self.cache_dir:
+            return
+        tmp_path = self.manifest_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.manifest, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Could not write template cache manifest: {e}")
+
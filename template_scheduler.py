@@ -0,0 +1,113 @@
+import heapq
+import math
+
+
+class TemplateScheduler:
+    # Picks which templates to match each frame. Every template keeps a
+    # hit rate (exponentially decayed over time, so old successes fade) and
+    # the time of its last hit. Each frame runs the top_k most promising
+    # templates plus explore_slots more taken round-robin from the rest, so
+    # the per-frame cost stays flat however many templates are loaded and
+    # no template is starved by a popular one. Exploration runs last, except
+    # every explore_interval-th frame when it runs first (with early exit,
+    # last would mean never once the favourite keeps hitting).
+
+    def __init__(self, top_k=3, explore_slots=1, explore_interval=10, rate_half_life=5.0,
+                 recency_half_life=2.0, recency_weight=0.5):
+        self.top_k = top_k
+        self.explore_slots = explore_slots
+        self.explore_interval = explore_interval
+        self.rate_decay = math.log(2) / rate_half_life  # Per second
+        self.recency_decay = math.log(2) / recency_half_life
+        self.recency_weight = recency_weight  # Bonus for a hit just now
+
+        self.templates = []
+        self.state = {}  # name -> {'rate', 'updated', 'last_hit', 'hits', 'runs'}
+        self.explore_cursor = 0
+        self.frames = 0
+
+    def set_templates(self, templates):
+        # Keep what we learned about templates that are still loaded
+        self.templates = list(templates)
+        old = self.state
+        self.state = {}
+        for template_info in self.templates:
+            name = template_info['name']
+            self.state[name] = old.get(name, {'rate': 0.0, 'updated': None, 'last_hit': None,
+                                              'hits': 0, 'runs': 0})
+        self.explore_cursor = 0
+
+    def priority(self, name, now):
+        state = self.state[name]
+        score = state['rate']
+        if state['updated'] is not None:
+            score *= math.exp(-self.rate_decay * (now - state['updated']))
+        if state['last_hit'] is not None:
+            score += self.recency_weight * math.exp(-self.recency_decay * (now - state['last_hit']))
+        return score
+
+    def select(self, now):
+        # Templates to match this frame, most promising first
+        self.frames += 1
+        if len(self.templates) <= self.top_k + self.explore_slots:
+            ordered = sorted(self.templates, key=lambda t: self.priority(t['name'], now), reverse=True)
+            if self.frames % self.explore_interval == 0 and len(ordered) > 1:
+                # Let the least likely template go first now and then
+                ordered.insert(0, ordered.pop())
+            return ordered
+
+        # Load order breaks ties, so a cold start runs the first templates
+        ranked = heapq.nlargest(self.top_k, enumerate(self.templates),
+                                key=lambda item: (self.priority(item[1]['name'], now), -item[0]))
+        chosen = [template_info for _, template_info in ranked]
+
+        # Exploration: the next templates (in load order) that were not picked
+        picked = {template_info['name'] for template_info in chosen}
+        explore = []
+        count = len(self.templates)
+        for _ in range(count):
+            if len(explore) >= self.explore_slots:
+                break
+            template_info = self.templates[self.explore_cursor]
+            self.explore_cursor = (self.explore_cursor + 1) % count
+            if template_info['name'] not in picked:
+                explore.append(template_info)
+                picked.add(template_info['name'])
+
+        if self.frames % self.explore_interval == 0:
+            return explore + chosen
+        return chosen + explore
+
+    def observe(self, selected, matches, now, early_exit=False):
+        # Update hit rates from one frame's (pre-NMS) matches. With early
+        # exit, templates after the last one that hit may not have run.
+        hits = {}
+        for match in matches:
+            hits[match['template']] = hits.get(match['template'], 0) + 1
+
+        ran = selected
+        if early_exit and hits:
+            last = max(i for i, t in enumerate(selected) if t['name'] in hits)
+            ran = selected[:last + 1]
+
+        for template_info in ran:
+            state = self.state.get(template_info['name'])
+            if state is None:
+                continue
+            hit = template_info['name'] in hits
+            # Time-based EMA: the weight of a new sample grows with the time since the last one
+            if state['updated'] is None:
+                weight = 0.5
+            else:
+                weight = 1.0 - math.exp(-self.rate_decay * max(0.0, now - state['updated']))
+            state['rate'] += weight * ((1.0 if hit else 0.0) - state['rate'])
+            state['updated'] = now
+            state['runs'] += 1
+            if hit:
+                state['hits'] += 1
+                state['last_hit'] = now
+
+    def summary(self, now):
+        # (name, priority, hits, runs), best first
+        rows = [(name, self.priority(name, now), s['hits'], s['runs']) for name, s in self.state.items()]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+# The modules live flat in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sun_detection  # noqa: E402
+
+
+SUN_PATH = os.path.join(ROOT, 'resources', 'sun.png')
+
+
+@pytest.fixture(autouse=True)
+def clean_response_cache():
+    # Incremental matching keeps response maps at module level
+    sun_detection._response_cache.clear()
+    yield
+    sun_detection._response_cache.clear()
+
+
+@pytest.fixture
+def sun_bgr():
+    return cv2.imread(SUN_PATH, cv2.IMREAD_COLOR)
+
+
+@pytest.fixture
+def sun_variant():
+    # The shipped sun template as the bot uses it at downscale_factor 0.75
+    gray = cv2.imread(SUN_PATH, cv2.IMREAD_GRAYSCALE)
+    gray = cv2.resize(gray, None, fx=0.75, fy=0.75, interpolation=cv2.INTER_AREA)
+    h, w = gray.shape
+    return {'gray': gray, 'coarse': None, 'name': 'sun.png', 'scale': 1.0,
+            'width': w, 'height': h}
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    # Template bank cache under tmp_path rather than the user's cache folder
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'cache'))
+    from sun_clicker_bot import SunClickerBot
+    bot = SunClickerBot()
+    bot.auto_roi = False  # Synthetic frames have no lawn
+    bot.use_parallel = False
+    yield bot
+    bot.matching_backend.close()
+    bot.telemetry.close()
+
+
+def textured_background(shape, seed=0):
+    # Smooth random texture, so no window of the frame is flat
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (0, 0), 3)
+
+
+def paste(frame, image, x, y):
+    h, w = image.shape[:2]
+    frame[y:y + h, x:x + w] = image
+    return frame
+
+
+def falling_suns(frame_count, step=4):
+    # Per frame, the top-left corners of three suns falling at different
+    # speeds (the third wraps back to the top); fits a 300x360 frame
+    return [[(40, 10 + i * step), (150, 30 + i * step // 2), (260, 5 + i * step * 2 % 200)]
+            for i in range(frame_count)]
@@ -0,0 +1,64 @@
+import time
+
+from click_dispatcher import ClickDispatcher, ClickHistory
+from sun_io import RecordingClickSink
+
+
+def test_history_finds_clicks_within_radius():
+    history = ClickHistory(radius=30, window=0.5)
+    history.add(100, 100, now=10.0)
+    assert history.contains(120, 110, now=10.1)
+    assert not history.contains(131, 100, now=10.1)
+
+
+def test_history_checks_neighbouring_cells():
+    # 59 and 61 hash to different 30 px cells but are 2 px apart
+    history = ClickHistory(radius=30, window=0.5)
+    history.add(59, 59, now=0.0)
+    assert history.contains(61, 61, now=0.0)
+
+
+def test_history_expires_old_clicks():
+    history = ClickHistory(radius=30, window=0.5)
+    history.add(100, 100, now=10.0)
+    history.add(300, 300, now=10.4)
+    assert len(history) == 2
+    assert not history.contains(100, 100, now=10.6)
+    assert history.contains(300, 300, now=10.6)
+    assert len(history) == 1
+
+
+def target(x, y, track_id=None):
+    now = time.time()
+    return {'x': x, 'y': y, 'captured_at': now, 'detected_at': now, 'track_id': track_id,
+            'template': 'sun.png', 'confidence': 0.9}
+
+
+def test_dispatcher_clicks_nearest_first():
+    sink = RecordingClickSink()
+    dispatcher = ClickDispatcher(sink=sink, min_interval=0)
+    dispatcher.cursor = (0, 0)
+    dispatcher.submit([target(500, 500), target(10, 10), target(100, 100)])
+    dispatcher.flush()
+    assert [(x, y) for x, y, _ in sink.clicks] == [(10, 10), (100, 100), (500, 500)]
+
+
+def test_dispatcher_replaces_pending_targets_of_the_same_track():
+    sink = RecordingClickSink()
+    dispatcher = ClickDispatcher(sink=sink, min_interval=0)
+    dispatcher.submit([target(10, 10, track_id=1)])
+    dispatcher.submit([target(12, 20, track_id=1)])
+    dispatcher.flush()
+    assert [(x, y) for x, y, _ in sink.clicks] == [(12, 20)]
+
+
+def test_dispatcher_skips_stale_and_resolved_targets():
+    sink = RecordingClickSink()
+    dispatcher = ClickDispatcher(sink=sink, min_interval=0, max_age=0.25)
+    dispatcher.resolve = lambda t: None if t['x'] == 50 else (t['x'], t['y'])
+    stale = target(10, 10)
+    stale['detected_at'] -= 1.0
+    dispatcher.submit([stale, target(50, 50), target(90, 90)])
+    dispatcher.flush()
+    assert [(x, y) for x, y, _ in sink.clicks] == [(90, 90)]
+    assert dispatcher.stats.skipped == 1
@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+
+from debug_view import DebugRenderer
+
+
+def renderer():
+    # Flags set as start() would, without opening a window or a thread
+    debug = DebugRenderer(max_fps=10.0, scale=0.5)
+    debug.enabled = True
+    debug.running = True
+    return debug
+
+
+def test_wants_frame_only_when_shown_and_the_mailbox_is_empty():
+    debug = DebugRenderer()
+    assert not debug.wants_frame(now=1.0)
+    debug = renderer()
+    assert debug.wants_frame(now=1.0)
+    debug.post(np.zeros((100, 200, 4), np.uint8), [], False, [], 1.0)
+    assert not debug.wants_frame(now=time.time() + 10.0)  # Renderer hasn't taken it yet
+    debug.mailbox.get(timeout=0.0)
+    assert not debug.wants_frame(now=time.time())  # max_fps
+    assert debug.wants_frame(now=debug.next_due)
+
+
+def test_post_downscales_the_frame_and_boxes():
+    debug = renderer()
+    match = {'location': (40, 20), 'width': 30, 'height': 30, 'confidence': 0.9,
+             'template': 'sun.png'}
+    debug.post(np.zeros((300, 400, 4), np.uint8), [match], True, ['line'], 0.75)
+    item = debug.mailbox.get(timeout=0.0)
+    assert item['frame'].shape == (150, 200, 4)
+    # Matches are in 0.75x frame pixels, the display is 0.5x
+    assert item['boxes'] == [(26, 13, 20, 20, 0.9, 'sun.png')]
+    assert item['paused'] and item['lines'] == ['line']
+
+
+def test_post_alternates_between_two_slots():
+    debug = renderer()
+    frame = np.zeros((100, 200, 4), np.uint8)
+    debug.post(frame, [], False, [], 1.0)
+    first = debug.mailbox.get(timeout=0.0)['frame']
+    debug.post(frame, [], False, [], 1.0)
+    second = debug.mailbox.get(timeout=0.0)['frame']
+    debug.post(frame, [], False, [], 1.0)
+    assert second is not first and debug.mailbox.get(timeout=0.0)['frame'] is first
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from frame_scheduler import FrameScheduler
+
+
+def settle(scheduler, frame_times, rounds=100):
+    for _ in range(rounds):
+        scheduler.adapt(frame_times)
+    return scheduler.fps
+
+
+def test_cpu_budget_caps_the_rate():
+    # 50 ms of work per frame with half a core to spend: 10 frames/s, though
+    # the 60 ms latency bound alone would ask for 100
+    scheduler = FrameScheduler(target_fps=30.0, min_fps=5.0, cpu_budget=0.5, max_latency=0.06)
+    assert settle(scheduler, [0.05] * 10) == pytest.approx(10.0, rel=1e-3)
+
+
+def test_latency_bound_sets_the_slowest_rate():
+    # 10 ms of work and a 150 ms bound leave a 140 ms period
+    scheduler = FrameScheduler(target_fps=30.0, min_fps=1.0, cpu_budget=1.0, max_latency=0.15)
+    assert settle(scheduler, [0.01]) == pytest.approx(1 / 0.14, rel=1e-3)
+
+
+def test_rate_stays_within_min_and_target():
+    scheduler = FrameScheduler(target_fps=30.0, min_fps=5.0, cpu_budget=0.5, max_latency=0.15)
+    assert settle(scheduler, [0.5]) == pytest.approx(5.0, rel=1e-3)
+    # Work longer than max_latency: the bound can't be met, so go as fast as allowed
+    scheduler = FrameScheduler(target_fps=30.0, min_fps=5.0, cpu_budget=100.0, max_latency=0.15)
+    assert settle(scheduler, [0.2]) == pytest.approx(30.0, rel=1e-3)
+
+
+def test_adapt_moves_gradually_and_ignores_empty_input():
+    scheduler = FrameScheduler(target_fps=30.0, min_fps=5.0, cpu_budget=0.5, max_latency=0.06)
+    scheduler.adapt([])
+    assert scheduler.fps == 30.0
+    scheduler.adapt([0.05])
+    assert 10.0 < scheduler.fps < 30.0
+
+
+def test_non_adaptive_runs_at_target():
+    scheduler = FrameScheduler(target_fps=20.0)
+    scheduler.fps = 7.0
+    scheduler.adaptive = False
+    scheduler.adapt([0.05])
+    assert scheduler.fps == 20.0
+
+
+def test_wait_paces_frames():
+    scheduler = FrameScheduler(target_fps=100.0)
+    scheduler.adaptive = False
+    start = time.perf_counter()
+    for _ in range(6):
+        scheduler.wait()
+    # The first wait returns at once, the other five sleep about 10 ms each
+    assert time.perf_counter() - start >= 0.045
+
+
+def test_queue_wait_counts_toward_latency_not_cpu():
+    # 10 ms of work, but frames wait 90 ms in the queue: the latency bound
+    # leaves a 50 ms period while the CPU cap (50 frames/s) stays out of it
+    scheduler = FrameScheduler(target_fps=30.0, min_fps=1.0, cpu_budget=0.5, max_latency=0.15)
+    for _ in range(100):
+        scheduler.adapt([0.01], [0.1])
+    assert scheduler.fps == pytest.approx(20.0, rel=1e-3)
+    # Fed the latencies as work, the CPU cap would drop it to 5
+    assert settle(FrameScheduler(target_fps=30.0, min_fps=1.0, cpu_budget=0.5,
+                                 max_latency=0.15), [0.1]) == pytest.approx(5.0, rel=1e-3)
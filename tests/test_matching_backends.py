@@ -0,0 +1,107 @@
+import time
+
+import numpy as np
+
+from conftest import paste, textured_background
+from matching_backends import AutoBackend, ProcessBackend, SerialBackend, split_stripes
+
+
+def test_stripes_overlap_and_cover_the_frame():
+    stripes = split_stripes((300, 400), [None], stripes=3, overlap=20, min_height=96)
+    assert stripes == [(0, 0, 400, 120), (0, 100, 400, 120), (0, 200, 400, 100)]
+
+
+def test_small_regions_are_not_split():
+    regions = [(10, 20, 50, 60), None]
+    stripes = split_stripes((300, 400), regions, stripes=4, overlap=20, min_height=96)
+    assert stripes[0] == (10, 20, 50, 60)
+    assert len(stripes) == 1 + 3  # 300 px tall frame: at most 300 // 96 stripes
+
+
+class FakeBackend:
+    def __init__(self, name, delay, ready=True):
+        self.name = name
+        self.delay = delay
+        self.ready = ready
+        self.calls = 0
+        self.loaded = None
+
+    def match(self, *args):
+        self.calls += 1
+        time.sleep(self.delay)
+        return []
+
+    def load(self, templates):
+        self.loaded = templates
+
+    def close(self):
+        pass
+
+
+def run_frames(auto, count, templates=('a', 'b')):
+    frame = np.zeros((100, 100), np.uint8)
+    for _ in range(count):
+        auto.match(frame, None, list(templates), [None], {}, False)
+
+
+def test_auto_backend_probes_every_candidate_then_keeps_the_fastest():
+    slow, fast = FakeBackend('slow', 0.02), FakeBackend('fast', 0.0)
+    auto = AutoBackend({'slow': slow, 'fast': fast}, trials=2, reprobe_interval=1000)
+    run_frames(auto, 6)  # One warm-up plus two timed frames each
+    assert slow.calls == 3 and fast.calls == 3
+    run_frames(auto, 10)
+    assert slow.calls == 3 and fast.calls == 13
+    assert auto.last_backend == 'fast'
+
+
+def test_auto_backend_reprobes_and_resets_on_load():
+    slow, fast = FakeBackend('slow', 0.02), FakeBackend('fast', 0.0)
+    auto = AutoBackend({'slow': slow, 'fast': fast}, trials=1, reprobe_interval=5)
+    # Four probe frames, the frame that decides, then reprobe_interval more
+    run_frames(auto, 4 + 1 + 5)
+    assert slow.calls == 2
+    run_frames(auto, 1)  # Interval over: probing starts again
+    assert slow.calls == 3
+
+    auto.load(['t'])
+    assert slow.loaded == ['t'] and fast.loaded == ['t']
+    assert auto.choice == {}
+
+
+def test_auto_backend_keys_choices_by_workload():
+    auto = AutoBackend({'serial': FakeBackend('serial', 0.0)}, trials=1)
+    frame = np.zeros((100, 100), np.uint8)
+    assert auto.workload_key(frame, ['a'], [None]) == (1, 13)
+    assert auto.workload_key(frame, ['a', 'b'], [(0, 0, 10, 10)]) == (2, 6)
+
+
+def test_auto_backend_skips_candidates_until_ready():
+    fast, starting = FakeBackend('fast', 0.0), FakeBackend('process', 0.0, ready=False)
+    auto = AutoBackend({'fast': fast, 'process': starting}, trials=1, reprobe_interval=5)
+    run_frames(auto, 2 + 1 + 5)
+    assert starting.calls == 0 and auto.choice
+    starting.ready = True
+    run_frames(auto, 2)  # Re-probing now includes it
+    assert starting.calls == 1
+
+
+def test_process_backend_warms_up_on_load(sun_variant):
+    template_info = dict(sun_variant, variants=[sun_variant])
+    frame = paste(textured_background((200, 300), seed=5), sun_variant['gray'], 100, 50)
+    params = {'threshold': 0.7, 'multi_detect': True, 'coarse_margin': 0.15,
+              'max_coarse_candidates': 20}
+    backend = ProcessBackend(max_workers=2)
+    try:
+        backend.load([template_info])
+        deadline = time.time() + 30.0
+        while not backend.ready and time.time() < deadline:
+            time.sleep(0.05)
+        assert backend.ready
+        matches = backend.match(frame, None, [template_info], [None], params, False)
+        expected = SerialBackend().match(frame, None, [template_info], [None], params, False)
+        assert [m['location'] for m in matches] == [m['location'] for m in expected] == [(100, 50)]
+
+        backend.load([template_info])  # A reload restarts the workers
+        assert not backend.ready
+    finally:
+        backend.close()
@@ -0,0 +1,145 @@
+import json
+
+import cv2
+import pytest
+
+from conftest import falling_suns, paste, textured_background
+from sun_io import RecordingSource, ReplaySource, open_source
+from matching_backends import SerialBackend
+from sun_replay import build_parser, configure_bot, match_points, run_bench, run_replay
+
+
+def test_match_points_is_one_to_one():
+    detected = [(10, 10), (12, 10), (200, 200)]
+    expected = [(11, 10), (100, 100)]
+    assert match_points(detected, expected, radius=5) == (1, 2, 1)
+    assert match_points([], expected, radius=5) == (0, 0, 2)
+
+
+@pytest.fixture
+def recorded_frames(tmp_path, sun_bgr):
+    # 20 PNG frames of falling suns plus their ground truth centers
+    frames_dir = tmp_path / 'frames'
+    frames_dir.mkdir()
+    background = cv2.merge([textured_background((400, 480), seed=s) for s in (3, 4, 5)])
+    h, w = sun_bgr.shape[:2]
+    truth = {}
+    for i, positions in enumerate(falling_suns(20, step=6)):
+        frame = background.copy()
+        for x, y in positions:
+            paste(frame, sun_bgr, x, y)
+        name = f"frame_{i:04d}.png"
+        cv2.imwrite(str(frames_dir / name), frame)
+        truth[name] = [[x + w // 2, y + h // 2] for x, y in positions]
+    return str(frames_dir), truth
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_replay_finds_every_sun(bot, recorded_frames, incremental):
+    frames_dir, truth = recorded_frames
+    bot.use_incremental = incremental
+    source = ReplaySource(frames_dir)
+    try:
+        report = run_replay(bot, source, truth=truth)
+    finally:
+        source.close()
+
+    assert report['frames'] == 20
+    assert report['accuracy']['recall'] == 1.0
+    assert report['accuracy']['precision'] == 1.0
+    assert report['clicks'] > 0
+    assert bot.click_dispatcher.sink.clicks
+    assert report['stages']['detect']['count'] == 20
+
+
+def test_frame_skip_decimates_the_recording(bot, recorded_frames):
+    frames_dir, truth = recorded_frames
+    source = ReplaySource(frames_dir)
+    try:
+        report = run_replay(bot, source, truth=truth, frame_skip=2)
+    finally:
+        source.close()
+    assert report['frames'] == 10
+    assert report['accuracy']['frames_evaluated'] == 10
+    assert report['settings']['frame_skip'] == 2
+
+
+@pytest.mark.parametrize('mode', ['gray', 'crop'])
+def test_recording_replays_frame_by_frame(bot, recorded_frames, tmp_path, mode):
+    frames_dir, truth = recorded_frames
+    recording = str(tmp_path / f'session_{mode}')
+    bot.record_mode = mode
+    bot.start_recording(recording)
+    source = ReplaySource(frames_dir)
+    try:
+        run_replay(bot, source)
+    finally:
+        source.close()
+        bot.stop_recording()
+
+    source = open_source(recording)
+    assert isinstance(source, RecordingSource)
+    assert source.monitors[1]['width'] == 480 and source.monitors[1]['height'] == 400
+    baseline = source.detections()
+    assert len(baseline) == 20
+    assert sum(len(points) for points in baseline.values()) == sum(len(p) for p in truth.values())
+
+    # Replaying the recording reproduces the recorded detections
+    report = run_replay(bot, source, truth=baseline)
+    assert report['frames'] == 20
+    assert report['accuracy']['precision'] == 1.0
+    assert report['accuracy']['recall'] == 1.0
+    if mode == 'crop':
+        png = cv2.imread(f"{frames_dir}/frame_0000.png", cv2.IMREAD_COLOR)
+        first = RecordingSource(recording)
+        assert first.advance()
+        assert (first.frame[:, :, :3] == png).all()
+
+
+def test_recordings_replay_with_their_capture_times(bot, recorded_frames, tmp_path):
+    frames_dir, _ = recorded_frames
+    recording = str(tmp_path / 'session')
+    bot.start_recording(recording)
+    source = ReplaySource(frames_dir)
+    try:
+        packet = bot.capture_frame(source)
+        assert packet['timestamp'] == packet['captured_at']  # No recorded clock
+        run_replay(bot, source)
+    finally:
+        source.close()
+        bot.stop_recording()
+
+    source = RecordingSource(recording)
+    times = [entry['t'] for entry in source.entries]
+    packets = [bot.capture_frame(source) for _ in range(3)]
+    assert [p['timestamp'] for p in packets] == times[:3]
+    assert all(p['captured_at'] > times[-1] for p in packets)
+
+
+def test_bench_writes_the_report(bot, recorded_frames, tmp_path):
+    frames_dir, truth = recorded_frames
+    truth_path = tmp_path / 'truth.json'
+    truth_path.write_text(json.dumps(truth))
+    report_path = tmp_path / 'report.json'
+    assert run_bench(bot, frames_dir, truth_path=str(truth_path), report_path=str(report_path)) == 0
+    report = json.loads(report_path.read_text())
+    assert report['frames'] == 20 and report['accuracy']['recall'] == 1.0
+
+
+def test_bench_baseline_needs_a_recording(bot, recorded_frames, tmp_path):
+    frames_dir, _ = recorded_frames
+    report_path = tmp_path / 'report.json'
+    assert run_bench(bot, frames_dir, baseline=True, report_path=str(report_path)) == 1
+    assert not report_path.exists()
+
+
+def test_command_line_flags_configure_the_bot(bot):
+    width = bot.templates[0]['width']
+    args = build_parser().parse_args(['frames', '--downscale', '0.5', '--confidence', '0.8',
+                                      '--workers', '0', '--backend', 'serial', '--motion-gate',
+                                      '--no-tracker'])
+    configure_bot(bot, args)
+    assert bot.downscale_factor == 0.5 and bot.templates[0]['width'] < width
+    assert bot.confidence_threshold == 0.8
+    assert isinstance(bot.matching_backend, SerialBackend) and not bot.use_parallel
+    assert bot.use_motion_gate and not bot.use_tracker and not bot.use_incremental
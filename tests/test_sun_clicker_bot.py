@@ -0,0 +1,48 @@
+from matching_backends import SerialBackend, ThreadBackend
+
+
+def test_apply_config_sets_attributes_and_scheduler_limits(bot):
+    reloaded = bot.apply_config({
+        'detection': {'confidence_threshold': 0.8, 'early_exit': False},
+        'capture': {'target_fps': 20, 'cpu_budget': 0.3},
+        'filters': {'tracker': False}
+    })
+    assert not reloaded
+    assert bot.confidence_threshold == 0.8 and bot.early_exit is False
+    assert bot.use_tracker is False
+    assert bot.scheduler.target_fps == 20 and bot.scheduler.fps == 20
+    assert bot.scheduler.cpu_budget == 0.3
+
+
+def test_apply_config_ignores_unknown_keys(bot, capsys):
+    bot.apply_config({'detection': {'bogus': 1}, 'stray': 5})
+    out = capsys.readouterr().out
+    assert 'unknown setting detection.bogus' in out and "ignoring 'stray'" in out
+
+
+def test_apply_config_rebuilds_the_matching_backend(bot):
+    old = bot.matching_backend
+    bot.apply_config({'matching': {'backend': 'thread', 'workers': 2}})
+    assert isinstance(bot.matching_backend, ThreadBackend) and bot.matching_backend is not old
+    assert bot.max_workers == 2 and bot.use_parallel
+    bot.apply_config({'matching': {'backend': 'serial', 'workers': 0}})
+    assert isinstance(bot.matching_backend, SerialBackend)
+    assert bot.max_workers == 1 and not bot.use_parallel
+
+
+def test_apply_config_reloads_templates_when_their_settings_change(bot):
+    width = bot.templates[0]['width']
+    assert not bot.apply_config({'detection': {'downscale_factor': 0.75}})
+    assert bot.apply_config({'detection': {'downscale_factor': 0.5}})
+    assert bot.templates[0]['width'] < width
+    assert not bot.apply_config({'detection': {'downscale_factor': 1.0}}, reload=False)
+    assert bot.downscale_factor == 1.0
+
+
+def test_fixed_roi_wins_over_auto_roi_in_any_order(bot):
+    for capture in ({'roi': [10, 20, 300, 200], 'auto_roi': True},
+                    {'auto_roi': True, 'roi': [10, 20, 300, 200]}):
+        bot.apply_config({'capture': capture})
+        assert bot.roi == (10, 20, 300, 200) and bot.use_roi and not bot.auto_roi
+    bot.apply_config({'capture': {'roi': None, 'auto_roi': True}})
+    assert bot.roi is None and not bot.use_roi and bot.auto_roi
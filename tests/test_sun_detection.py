@@ -0,0 +1,229 @@
+import cv2
+import numpy as np
+import pytest
+
+from conftest import falling_suns, paste, textured_background
+from sun_detection import (ColorPrefilter, MotionGate, TileChangeTracker, coarse_candidates,
+                           dirty_response_boxes, find_peaks, match_response, match_template_best,
+                           match_template_incremental, match_template_peaks,
+                           match_template_regions, non_max_suppression)
+from template_bank import template_stats
+
+
+def box(x, y, confidence, size=20, name='sun.png'):
+    return {'location': (x, y), 'width': size, 'height': size, 'confidence': confidence,
+            'template': name}
+
+
+def test_nms_keeps_most_confident_of_overlapping_boxes():
+    matches = [box(0, 0, 0.8), box(2, 2, 0.9), box(100, 100, 0.7)]
+    kept = non_max_suppression(matches, 0.3)
+    assert [m['confidence'] for m in kept] == [0.9, 0.7]
+
+
+def test_nms_keeps_boxes_below_the_overlap_threshold():
+    # IoU of two 20x20 boxes offset by 15 px is 100 / 700
+    matches = [box(0, 0, 0.8), box(15, 0, 0.9)]
+    assert len(non_max_suppression(matches, 0.3)) == 2
+    assert len(non_max_suppression(matches, 0.1)) == 1
+
+
+def test_nms_handles_empty_and_single():
+    assert non_max_suppression([]) == []
+    single = [box(5, 5, 0.5)]
+    assert non_max_suppression(single) == single
+
+
+def test_find_peaks_separates_neighbouring_maxima():
+    response = np.zeros((60, 100), dtype=np.float32)
+    response[20, 20] = 0.9
+    response[20, 70] = 0.8
+    response[21, 20] = 0.85  # Shoulder of the first peak, not a peak itself
+    peaks = find_peaks(response, 0.7, 20, 20, 'sun.png')
+    assert sorted(p['location'] for p in peaks) == [(20, 20), (70, 20)]
+
+
+def test_find_peaks_below_threshold():
+    response = np.full((30, 30), 0.5, dtype=np.float32)
+    assert find_peaks(response, 0.7, 10, 10) == []
+
+
+def test_stats_path_matches_cv2(sun_variant):
+    # The precomputed-statistics path (template_bank) is TM_CCOEFF_NORMED
+    frame = paste(textured_background((200, 300), seed=1), sun_variant['gray'], 120, 60)
+    template = sun_variant['gray']
+    expected = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+    actual = match_response(frame, template, template_stats(template), ('full', None), frame_id=1)
+    assert actual.shape == expected.shape
+    assert np.abs(actual - expected).max() < 1e-3
+    assert np.unravel_index(np.argmax(actual), actual.shape) == (60, 120)
+
+
+def test_motion_gate_skips_unchanged_frames():
+    gate = MotionGate(scale=0.25, refresh_interval=1.0)
+    frame = textured_background((240, 320))
+    assert gate.regions(frame, (10, 10), now=0.0) is None  # First frame: match everything
+    assert gate.regions(frame, (10, 10), now=0.1) == []
+
+
+def test_motion_gate_boxes_the_changed_area():
+    gate = MotionGate(scale=0.25, refresh_interval=1.0)
+    frame = textured_background((240, 320))
+    gate.regions(frame, (10, 10), now=0.0)
+    moved = paste(frame.copy(), np.full((20, 20), 255, np.uint8), 200, 100)
+    boxes = gate.regions(moved, (10, 10), now=0.1)
+    assert len(boxes) == 1
+    x, y, w, h = boxes[0]
+    # Covers the change plus padding, far less than the frame
+    assert x <= 200 and y <= 100 and x + w >= 220 and y + h >= 120
+    assert w * h < 0.1 * frame.size
+
+
+def test_motion_gate_matches_everything_on_large_changes_and_refresh():
+    gate = MotionGate(scale=0.25, refresh_interval=1.0, max_changed_fraction=0.4)
+    frame = textured_background((240, 320))
+    gate.regions(frame, (10, 10), now=0.0)
+    flash = paste(frame.copy(), np.full((200, 300), 255, np.uint8), 0, 0)
+    assert gate.regions(flash, (10, 10), now=0.1) is None
+    assert gate.regions(flash, (10, 10), now=0.2) == []
+    # No change, but the refresh interval is up
+    assert gate.regions(flash, (10, 10), now=1.5) is None
+
+
+def bgra_scene(shape, seed=0):
+    # Gray-green textured BGRA frame: nothing in it is sun yellow
+    gray = textured_background(shape, seed) // 2
+    return cv2.merge([gray, gray + 60, gray, np.full(shape, 255, np.uint8)])
+
+
+def test_color_prefilter_finds_the_sun(sun_bgr):
+    frame = bgra_scene((400, 600))
+    paste(frame, cv2.cvtColor(sun_bgr, cv2.COLOR_BGR2BGRA), 300, 150)
+    h, w = sun_bgr.shape[:2]
+    boxes = ColorPrefilter(step=4, min_area=20).regions(frame, 0.5, (10, 10))
+    assert len(boxes) == 1
+    x, y, bw, bh = boxes[0]
+    # In downscaled coordinates, around the sun's 0.5x footprint
+    assert x <= 150 and y <= 75 and x + bw >= 150 + w // 2 - 4 and y + bh >= 75 + h // 2 - 4
+    assert bw * bh < 300 * 200 / 4
+
+
+def test_color_prefilter_ignores_frames_and_specks_without_suns():
+    frame = bgra_scene((400, 600))
+    prefilter = ColorPrefilter(step=4, min_area=20)
+    assert prefilter.regions(frame, 0.5, (10, 10)) == []
+    # A yellow speck smaller than min_area sampled pixels
+    paste(frame, np.array([[[0, 220, 240, 255]]], np.uint8).repeat(8, 0).repeat(8, 1), 40, 40)
+    assert prefilter.regions(frame, 0.5, (10, 10)) == []
+
+
+def coarse_variant(variant):
+    return dict(variant, coarse=cv2.pyrDown(variant['gray']), coarse_stats=None)
+
+
+def test_coarse_candidates_surround_the_sun(sun_variant):
+    variant = coarse_variant(sun_variant)
+    frame = paste(textured_background((240, 320), seed=3), variant['gray'], 201, 87)
+    boxes = coarse_candidates(cv2.pyrDown(frame), variant, [None], frame.shape,
+                              threshold=0.55, max_candidates=20)
+    assert boxes
+    assert any(x <= 201 and y <= 87 and x + w >= 201 + variant['width'] and
+               y + h >= 87 + variant['height'] for x, y, w, h in boxes)
+    assert sum(w * h for _, _, w, h in boxes) < 0.1 * frame.size
+
+
+def test_coarse_candidates_keep_regions_too_small_to_search(sun_variant):
+    variant = coarse_variant(sun_variant)
+    frame = textured_background((240, 320))
+    # At half resolution this region is narrower than the coarse template
+    region = (11, 11, variant['width'] - 3, variant['height'] - 3)
+    assert coarse_candidates(cv2.pyrDown(frame), variant, [region], frame.shape, 0.55, 20) == [region]
+
+
+def test_coarse_to_fine_finds_what_full_matching_finds(sun_variant):
+    variant = coarse_variant(sun_variant)
+    template_info = dict(variant, variants=[variant])
+    frame = textured_background((240, 320), seed=4)
+    for x, y in ((30, 40), (150, 151), (260, 20)):
+        paste(frame, variant['gray'], x, y)
+    params = {'threshold': 0.7, 'multi_detect': True, 'coarse_margin': 0.15,
+              'max_coarse_candidates': 20}
+    full = match_template_regions(frame, template_info, [None], None, params)
+    coarse = match_template_regions(frame, template_info, [None], cv2.pyrDown(frame), params)
+    locations = {m['location'] for m in full}
+    assert locations == {(30, 40), (150, 151), (260, 20)}
+    assert {m['location'] for m in coarse} == locations
+
+
+def test_tile_tracker_marks_only_changed_tiles():
+    tracker = TileChangeTracker(tile_size=32)
+    frame = textured_background((96, 128))
+    first = tracker.update(frame, 1).copy()
+    assert first.shape == (3, 4) and (first == 1).all()
+
+    changed = frame.copy()
+    changed[40, 70] ^= 0xFF
+    last_changed = tracker.update(changed, 2)
+    assert last_changed[1, 2] == 2
+    last_changed[1, 2] = 1
+    assert (last_changed == 1).all()
+
+
+def test_dirty_response_boxes_cover_windows_touching_the_tile():
+    dirty = np.zeros((4, 4), dtype=bool)
+    dirty[1, 2] = True
+    # Frame 128x128, template 20x10: response map is 109 wide, 119 high
+    boxes = dirty_response_boxes(dirty, 32, (20, 10), (128, 128))
+    assert boxes == [(64 - 19, 32 - 9, 96, 64)]
+
+
+def test_dirty_response_boxes_clip_to_the_response_map():
+    dirty = np.zeros((4, 4), dtype=bool)
+    dirty[3, 3] = True
+    boxes = dirty_response_boxes(dirty, 32, (20, 20), (128, 128))
+    assert boxes == [(96 - 19, 96 - 19, 109, 109)]
+
+
+@pytest.mark.parametrize('multi_detect', [True, False])
+def test_incremental_matches_full_matching(sun_variant, multi_detect):
+    # Over moving suns on a static background, the cached response maps
+    # give the same matches as matching every frame from scratch
+    background = textured_background((300, 360), seed=2)
+    tracker = TileChangeTracker(tile_size=32)
+    threshold = 0.7
+    found = 0
+    for frame_id, positions in enumerate(falling_suns(60), start=1):
+        frame = background.copy()
+        for x, y in positions:
+            paste(frame, sun_variant['gray'], x, y)
+
+        params = {'threshold': threshold, 'multi_detect': multi_detect, 'frame_id': frame_id,
+                  'tile_changes': tracker.update(frame, frame_id), 'tile_size': 32}
+        incremental = match_template_incremental(frame, sun_variant, params)
+        if not multi_detect:
+            # Identical suns tie for best, so only the score is comparable
+            best = match_template_best(frame, sun_variant, threshold)
+            assert len(incremental) == len(best) == 1
+            assert incremental[0]['confidence'] == pytest.approx(best[0]['confidence'], abs=1e-3)
+            found += 1
+            continue
+
+        full = match_template_peaks(frame, sun_variant, threshold)
+        assert sorted(m['location'] for m in incremental) == sorted(m['location'] for m in full)
+        by_location = {m['location']: m['confidence'] for m in full}
+        for match in incremental:
+            assert match['confidence'] == pytest.approx(by_location[match['location']], abs=1e-3)
+        found += len(full)
+    assert found >= 60 * (3 if multi_detect else 1)
+
+
+def test_incremental_returns_copies(sun_variant):
+    frame = paste(textured_background((120, 160)), sun_variant['gray'], 30, 30)
+    tracker = TileChangeTracker(tile_size=32)
+    params = {'threshold': 0.7, 'multi_detect': True, 'frame_id': 1,
+              'tile_changes': tracker.update(frame, 1), 'tile_size': 32}
+    first = match_template_incremental(frame, sun_variant, params)
+    first[0]['click'] = (0, 0)
+    params.update(frame_id=2, tile_changes=tracker.update(frame, 2))
+    second = match_template_incremental(frame, sun_variant, params)
+    assert 'click' not in second[0]
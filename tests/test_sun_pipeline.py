@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+from sun_pipeline import FrameBufferRing, FrameQueue
+
+
+def test_buffer_ring_reuses_slots_round_robin():
+    ring = FrameBufferRing(size=2)
+    first = ring.next((480, 640, 4), 0.75)
+    second = ring.next((480, 640, 4), 0.75)
+    assert first is not second
+    assert ring.next((480, 640, 4), 0.75) is first
+    assert first['gray_full'].shape == (480, 640)
+    assert first['gray'].shape == (360, 480)
+    assert first['coarse'].shape == (180, 240)
+
+
+def test_buffer_ring_reallocates_on_new_size_or_factor():
+    ring = FrameBufferRing(size=2)
+    slot = ring.next((480, 640, 4), 0.75)
+    resized = ring.next((300, 400, 4), 0.75)
+    assert resized is not slot and resized['gray'].shape == (225, 300)
+    full = ring.next((300, 400, 4), 1.0)
+    assert full['gray'] is full['gray_full']
+
+
+def test_buffer_sizes_match_cv2_resize():
+    # Odd sizes: the preallocated dst must be what cv2.resize would produce
+    ring = FrameBufferRing(size=1)
+    for shape, factor in (((333, 517), 0.75), ((101, 99), 0.5), ((7, 9), 0.3)):
+        slot = ring.next(shape, factor)
+        expected = cv2.resize(np.zeros(shape, np.uint8), None, fx=factor, fy=factor,
+                              interpolation=cv2.INTER_AREA)
+        assert slot['gray'].shape == expected.shape
+        assert slot['coarse'].shape == cv2.pyrDown(expected).shape
+
+
+def test_frame_queue_drops_the_oldest():
+    queue = FrameQueue(maxsize=2)
+    for item in range(4):
+        queue.put(item)
+    assert queue.dropped == 2
+    assert [queue.get(), queue.get()] == [2, 3]
+    assert queue.get(timeout=0.01) is None
@@ -0,0 +1,54 @@
+import pytest
+
+from sun_tracker import SunTracker
+
+
+def detections(*points):
+    return [{'click': point} for point in points]
+
+
+def test_detections_keep_their_track_ids():
+    tracker = SunTracker(gate_distance=60)
+    first = detections((100, 100), (400, 100))
+    tracker.update(first, 0.0)
+    second = detections((402, 110), (101, 108))
+    tracker.update(second, 0.1)
+    assert second[0]['track_id'] == first[1]['track_id']
+    assert second[1]['track_id'] == first[0]['track_id']
+
+
+def test_far_detections_start_new_tracks():
+    tracker = SunTracker(gate_distance=60)
+    first = detections((100, 100))
+    tracker.update(first, 0.0)
+    second = detections((300, 100))
+    tracker.update(second, 0.1)
+    assert second[0]['track_id'] != first[0]['track_id']
+
+
+def test_prediction_leads_a_falling_sun():
+    # 100 px/s downwards: the click is aimed below the last detection
+    tracker = SunTracker(gate_distance=60, alpha=1.0, beta=1.0)
+    tracker.click_latency = 0.1
+    for i in range(6):
+        batch = detections((200, 100 + 10 * i))
+        tracker.update(batch, i * 0.1)
+    x, y = tracker.predict_click(batch[0]['track_id'])
+    assert x == 200
+    assert y == pytest.approx(150 + 10, abs=1)
+
+
+def test_reclick_suppression_and_expiry():
+    tracker = SunTracker(gate_distance=60, max_age=0.5)
+    batch = detections((100, 100))
+    tracker.update(batch, 0.0)
+    track_id = batch[0]['track_id']
+    assert tracker.should_click(track_id, 0.0)
+    tracker.mark_clicked(track_id, 0.05, 0.0)
+    assert not tracker.should_click(track_id, 0.5)
+    assert tracker.should_click(track_id, 0.05 + tracker.reclick_interval)
+
+    # Not seen for longer than max_age: forgotten
+    tracker.update([], 1.0)
+    assert tracker.predict_click(track_id) is None
+    assert not tracker.should_click(track_id, 2.0)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from telemetry import StreamingHistogram, Telemetry
+
+
+def test_histogram_percentiles_within_bucket_error():
+    histogram = StreamingHistogram(growth=1.1)
+    samples = np.random.default_rng(0).lognormal(mean=1.0, sigma=1.0, size=5000)
+    for ms in samples:
+        histogram.add(float(ms))
+    for q in (50, 90, 99):
+        assert histogram.percentile(q) == pytest.approx(np.percentile(samples, q), rel=0.1)
+    assert histogram.count == 5000
+    assert histogram.max_ms == pytest.approx(samples.max())
+
+
+def test_histogram_clamps_out_of_range_samples():
+    histogram = StreamingHistogram(min_ms=0.01, max_ms=100.0)
+    histogram.add(0.0)
+    histogram.add(1e6)
+    assert histogram.buckets[0] == 1
+    assert histogram.buckets[-1] == 1
+    assert histogram.max_ms == 1e6
+
+
+def test_empty_histogram():
+    histogram = StreamingHistogram()
+    assert histogram.percentile(50) == 0.0
+    assert histogram.summary() == {'count': 0}
+
+
+def test_telemetry_snapshot_and_prometheus_text():
+    telemetry = Telemetry()
+    with telemetry.timer('match'):
+        pass
+    telemetry.record('match:sun.png', 0.004)
+    telemetry.record('match:sun.png', 0.006)
+
+    snapshot = telemetry.snapshot()
+    assert snapshot['match']['count'] == 1
+    assert snapshot['match:sun.png']['count'] == 2
+    assert snapshot['match:sun.png']['mean_ms'] == pytest.approx(5.0)
+
+    text = telemetry.prometheus_text()
+    assert 'sun_clicker_stage_ms_count{stage="match:sun.png"} 2' in text
+    assert 'sun_clicker_stage_ms{stage="match",quantile="0.50"}' in text
+
+
+def test_telemetry_trace_file(tmp_path):
+    telemetry = Telemetry()
+    path = tmp_path / 'trace.csv'
+    telemetry.open_trace(str(path))
+    telemetry.record('capture', 0.002)
+    telemetry.close()
+    lines = path.read_text().splitlines()
+    assert lines[0] == 't,stage,ms'
+    assert lines[1].split(',')[1:] == ['capture', '2.0']
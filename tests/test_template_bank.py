@@ -0,0 +1,35 @@
+import numpy as np
+
+from conftest import SUN_PATH
+from template_bank import TemplateBank
+
+
+def test_bank_compiles_once_then_loads_from_cache(tmp_path):
+    cache_dir = str(tmp_path / 'bank')
+    bank = TemplateBank(cache_dir)
+    compiled = bank.variants(SUN_PATH, 'sun.png', 0.75, [1.0, 0.9], coarse_min_size=8)
+    bank.save()
+    assert (bank.hits, bank.misses) == (0, 2)
+
+    cached_bank = TemplateBank(cache_dir)
+    cached = cached_bank.variants(SUN_PATH, 'sun.png', 0.75, [1.0, 0.9], coarse_min_size=8)
+    assert (cached_bank.hits, cached_bank.misses) == (2, 0)
+    for a, b in zip(compiled, cached):
+        assert isinstance(b['gray'], np.memmap)
+        assert np.array_equal(a['gray'], b['gray'])
+        assert a['stats'] == b['stats'] and (a['width'], a['height']) == (b['width'], b['height'])
+
+
+def test_bank_recompiles_for_a_new_factor(tmp_path):
+    cache_dir = str(tmp_path / 'bank')
+    bank = TemplateBank(cache_dir)
+    bank.variants(SUN_PATH, 'sun.png', 0.75, [1.0], coarse_min_size=8)
+    bank.save()
+    bank = TemplateBank(cache_dir)
+    bank.variants(SUN_PATH, 'sun.png', 0.5, [1.0], coarse_min_size=8)
+    assert (bank.hits, bank.misses) == (0, 1)
+
+
+def test_bank_skips_unreadable_files(tmp_path):
+    assert TemplateBank().variants(str(tmp_path / 'missing.png'), 'missing.png', 0.75,
+                                   [1.0], coarse_min_size=8) is None
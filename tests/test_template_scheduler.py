@@ -0,0 +1,54 @@
+from template_scheduler import TemplateScheduler
+
+
+def templates(names='abcdef'):
+    return [{'name': name} for name in names]
+
+
+def names(selected):
+    return [t['name'] for t in selected]
+
+
+def test_cold_start_runs_load_order_and_explores_round_robin():
+    scheduler = TemplateScheduler(top_k=2, explore_slots=1, explore_interval=100)
+    scheduler.set_templates(templates())
+    assert names(scheduler.select(0.0)) == ['a', 'b', 'c']
+    assert names(scheduler.select(0.0)) == ['a', 'b', 'd']
+    assert names(scheduler.select(0.0)) == ['a', 'b', 'e']
+
+
+def test_hits_move_a_template_to_the_front():
+    scheduler = TemplateScheduler(top_k=2, explore_slots=1, explore_interval=100)
+    scheduler.set_templates(templates())
+    scheduler.observe(templates('e'), [{'template': 'e'}], now=1.0)
+    assert names(scheduler.select(1.0))[:2] == ['e', 'a']
+
+
+def test_early_exit_only_counts_templates_that_ran():
+    scheduler = TemplateScheduler(top_k=2, explore_slots=1)
+    scheduler.set_templates(templates())
+    scheduler.observe(templates('abc'), [{'template': 'a'}], now=1.0, early_exit=True)
+    assert [scheduler.state[n]['runs'] for n in 'abc'] == [1, 0, 0]
+    scheduler.observe(templates('abc'), [{'template': 'a'}], now=2.0)
+    assert [scheduler.state[n]['runs'] for n in 'abc'] == [2, 1, 1]
+
+
+def run_with_early_exit(scheduler, frames, hitting='a'):
+    # The favourite hits every frame, so matching stops there (observe
+    # works out which templates ran from the selection order)
+    for i in range(frames):
+        selected = scheduler.select(float(i))
+        scheduler.observe(selected, [{'template': hitting}], float(i), early_exit=True)
+
+
+def test_exploration_still_runs_when_the_favourite_keeps_hitting():
+    scheduler = TemplateScheduler(top_k=2, explore_slots=1, explore_interval=3)
+    scheduler.set_templates(templates())
+    run_with_early_exit(scheduler, 12)
+    # Every third frame explores first, cycling through c, d, e, f
+    assert {n for n, s in scheduler.state.items() if s['runs']} == set('acdef')
+
+    starved = TemplateScheduler(top_k=2, explore_slots=1, explore_interval=1000)
+    starved.set_templates(templates())
+    run_with_early_exit(starved, 12)
+    assert {n for n, s in starved.state.items() if s['runs']} == {'a'}